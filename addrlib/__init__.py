@@ -7,6 +7,9 @@
 # Addrlib
 # A Python/Cython Address Library for Wii U textures.
 
+from collections import namedtuple
+from functools import lru_cache
+
 try:
     import pyximport
     pyximport.install()
@@ -20,4 +23,38 @@ except:
 deswizzle = addrlib.deswizzle
 swizzle = addrlib.swizzle
 surfaceGetBitsPerPixel = addrlib.surfaceGetBitsPerPixel
-getSurfaceInfo = addrlib.getSurfaceInfo
+
+
+# Maximum number of distinct surface layouts to remember
+SURFACE_INFO_CACHE_SIZE = 1024
+
+TileInfo = namedtuple('TileInfo', [
+    'banks', 'bankWidth', 'bankHeight', 'macroAspectRatio',
+    'tileSplitBytes', 'pipeConfig',
+])
+
+SurfaceInfo = namedtuple('SurfaceInfo', [
+    'size', 'pitch', 'height', 'depth', 'surfSize', 'tileMode',
+    'baseAlign', 'pitchAlign', 'heightAlign', 'depthAlign', 'bpp',
+    'pixelPitch', 'pixelHeight', 'pixelBits', 'sliceSize',
+    'pitchTileMax', 'heightTileMax', 'sliceTileMax', 'pTileInfo',
+    'tileType', 'tileIndex',
+])
+
+
+@lru_cache(maxsize=SURFACE_INFO_CACHE_SIZE)
+def getSurfaceInfo(surfaceFormat, surfaceWidth, surfaceHeight, surfaceDepth, surfaceDim, surfaceTileMode, surfaceAA, level):
+    """
+    Returns the surface info for the given layout as an immutable
+    SurfaceInfo. Textures share layouts a lot, so results are cached.
+    """
+    pSurfOut = addrlib.getSurfaceInfo(
+        surfaceFormat, surfaceWidth, surfaceHeight, surfaceDepth,
+        surfaceDim, surfaceTileMode, surfaceAA, level,
+    )
+
+    tileInfo = TileInfo(*(getattr(pSurfOut.pTileInfo, field) for field in TileInfo._fields))
+    return SurfaceInfo(*(
+        tileInfo if field == 'pTileInfo' else getattr(pSurfOut, field)
+        for field in SurfaceInfo._fields
+    ))
@@ -8,6 +8,14 @@
 ################################################################
 ################################################################
 
+try:
+    import numpy as np
+    HAS_NUMPY = True
+
+except ImportError:
+    HAS_NUMPY = False
+
+
 BCn_formats = [
     0x31, 0x431, 0x32, 0x432,
     0x33, 0x433, 0x34, 0x234,
@@ -18,6 +26,14 @@ BCn_formats = [
 def swizzleSurf(width, height, height_, format_, tileMode, swizzle_,
                 pitch, bitsPerPixel, data, swizzle):
 
+    if tileMode in [0, 1] or (tileMode in [2, 3] and not HAS_NUMPY):
+        return swizzleSurfRuns(width, height, format_, tileMode,
+                               pitch, bitsPerPixel, data, swizzle)
+
+    elif HAS_NUMPY:
+        return swizzleSurfNp(width, height, height_, format_, tileMode, swizzle_,
+                             pitch, bitsPerPixel, data, swizzle)
+
     bytesPerPixel = bitsPerPixel // 8
     result = bytearray(len(data))
 
@@ -52,6 +68,139 @@ def swizzleSurf(width, height, height_, format_, tileMode, swizzle_,
     return bytes(result)
 
 
+def swizzleSurfNp(width, height, height_, format_, tileMode, swizzle_,
+                  pitch, bitsPerPixel, data, swizzle):
+
+    bytesPerPixel = bitsPerPixel // 8
+    dataSize = len(data)
+
+    if format_ in BCn_formats:
+        width = (width + 3) // 4
+        height = (height + 3) // 4
+
+    pipeSwizzle = (swizzle_ >> 8) & 1
+    bankSwizzle = (swizzle_ >> 9) & 3
+
+    y, x = np.indices((height, width), dtype=np.int64)
+
+    if tileMode in [0, 1]:
+        pos = (y * pitch + x) * bytesPerPixel
+
+    elif tileMode in [2, 3]:
+        # Only elementwise arithmetic in there, so it takes arrays as-is
+        pos = computeSurfaceAddrFromCoordMicroTiled(x, y, bitsPerPixel, pitch, tileMode)
+
+    else:
+        pos = computeSurfaceAddrFromCoordMacroTiledNp(x, y, bitsPerPixel, pitch, height_, tileMode,
+                                                      pipeSwizzle, bankSwizzle)
+
+    pos_ = (y * width + x) * bytesPerPixel
+
+    valid = (pos_ + bytesPerPixel <= dataSize) & (pos + bytesPerPixel <= dataSize)
+    byteOffsets = np.arange(bytesPerPixel, dtype=np.int64)
+    pos = (pos[valid][:, None] + byteOffsets).ravel()
+    pos_ = (pos_[valid][:, None] + byteOffsets).ravel()
+
+    src = np.frombuffer(data, dtype=np.uint8)
+    result = np.zeros(dataSize, dtype=np.uint8)
+
+    if swizzle == 0:
+        result[pos_] = src[pos]
+
+    else:
+        result[pos] = src[pos_]
+
+    return result.tobytes()
+
+
+def computeMicroTileRuns(bpp):
+    """
+    Returns, for each of the 8 rows of a micro tile, a list of
+    (x, byteOffset, count) runs of pixels that are stored contiguously
+    """
+    bytesPerPixel = bpp // 8
+    rowRuns = []
+
+    for y in range(8):
+        runs = []
+
+        for x in range(8):
+            offset = (bpp * computePixelIndexWithinMicroTile(x, y, bpp)) >> 3
+
+            if runs:
+                runX, runOffset, count = runs[-1]
+                if runX + count == x and runOffset + count * bytesPerPixel == offset:
+                    runs[-1] = (runX, runOffset, count + 1)
+                    continue
+
+            runs.append((x, offset, 1))
+
+        rowRuns.append(runs)
+
+    return rowRuns
+
+
+def swizzleSurfRuns(width, height, format_, tileMode,
+                    pitch, bitsPerPixel, data, swizzle):
+    """
+    Linear and micro tiled surfaces keep runs of pixels contiguous,
+    so copy those with one slice assignment each instead of per pixel
+    """
+    bytesPerPixel = bitsPerPixel // 8
+    dataSize = len(data)
+    result = bytearray(dataSize)
+
+    if format_ in BCn_formats:
+        width = (width + 3) // 4
+        height = (height + 3) // 4
+
+    src = memoryview(data)
+    dst = memoryview(result)
+
+    def copyRun(pos, pos_, count):
+        # Clip to the pixels that fit entirely inside the data
+        count = min(count, (dataSize - pos) // bytesPerPixel, (dataSize - pos_) // bytesPerPixel)
+        if count <= 0:
+            return
+
+        size = count * bytesPerPixel
+        if swizzle == 0:
+            dst[pos_:pos_ + size] = src[pos:pos + size]
+
+        else:
+            dst[pos:pos + size] = src[pos_:pos_ + size]
+
+    if tileMode in [0, 1]:
+        for y in range(height):
+            copyRun(y * pitch * bytesPerPixel, y * width * bytesPerPixel, width)
+
+        return bytes(result)
+
+    microTileThickness = 1
+
+    if tileMode == 3:
+        microTileThickness = 4
+
+    microTileBytes = (64 * microTileThickness * bitsPerPixel + 7) // 8
+    microTilesPerRow = pitch >> 3
+    rowRuns = computeMicroTileRuns(bitsPerPixel)
+
+    for y in range(height):
+        runs = rowRuns[y & 7]
+        rowPos = microTileBytes * (y >> 3) * microTilesPerRow
+        rowPos_ = y * width * bytesPerPixel
+
+        for tileX in range(0, width, 8):
+            tilePos = rowPos + microTileBytes * (tileX >> 3)
+
+            for runX, offset, count in runs:
+                x = tileX + runX
+                if x < width:
+                    copyRun(tilePos + offset, rowPos_ + x * bytesPerPixel, min(count, width - x))
+
+    return bytes(result)
+
+
 def deswizzle(width, height, height_, format_, tileMode, swizzle_,
               pitch, bpp, data):
 
@@ -295,9 +444,71 @@ def computeSurfaceAddrFromCoordMacroTiled(x, y, bpp, pitch, height,
     return bank << 9 | pipe << 8 | 255 & totalOffset | (totalOffset & -256) << 3
 
 
-expPitch = 0
-expHeight = 0
-expNumSlices = 0
+def computeSurfaceAddrFromCoordMacroTiledNp(x, y, bpp, pitch, height,
+                                            tileMode, pipeSwizzle,
+                                            bankSwizzle):
+
+    # x and y are same-shaped int64 arrays; returns an array of byte offsets
+    microTileThickness = computeSurfaceThickness(tileMode)
+
+    microTileBits = bpp * (microTileThickness * 64)
+    microTileBytes = (microTileBits + 7) // 8
+
+    pixelIndex = computePixelIndexWithinMicroTile(x, y, bpp)
+    elemOffset = bpp * pixelIndex
+
+    bytesPerSample = microTileBytes
+
+    if microTileBytes <= 2048:
+        numSamples = 1
+        sampleSlice = np.zeros_like(x)
+
+    else:
+        samplesPerSlice = 2048 // bytesPerSample
+        numSampleSplits = max(1, 1 // samplesPerSlice)
+        numSamples = samplesPerSlice
+        sampleSlice = elemOffset // (microTileBits // numSampleSplits)
+        elemOffset %= microTileBits // numSampleSplits
+
+    elemOffset = (elemOffset + 7) // 8
+
+    pipe = computePipeFromCoordWoRotation(x, y)
+    bank = computeBankFromCoordWoRotation(x, y)
+
+    swizzle_ = pipeSwizzle + 2 * bankSwizzle
+    bankPipe = ((pipe + 2 * bank) ^ (6 * sampleSlice ^ swizzle_)) % 8
+
+    pipe = bankPipe % 2
+    bank = bankPipe // 2
+
+    sliceBytes = (height * pitch * microTileThickness * bpp * numSamples + 7) // 8
+    sliceOffset = sliceBytes * (sampleSlice // microTileThickness)
+
+    macroTilePitch = 32
+    macroTileHeight = 16
+
+    if tileMode in [5, 9]:  # GX2_TILE_MODE_2D_TILED_THIN2 and GX2_TILE_MODE_2B_TILED_THIN2
+        macroTilePitch >>= 1
+        macroTileHeight *= 2
+
+    elif tileMode in [6, 10]:  # GX2_TILE_MODE_2D_TILED_THIN4 and GX2_TILE_MODE_2B_TILED_THIN4
+        macroTilePitch >>= 2
+        macroTileHeight *= 4
+
+    macroTilesPerRow = pitch // macroTilePitch
+    macroTileBytes = (numSamples * microTileThickness * bpp * macroTileHeight
+                      * macroTilePitch + 7) // 8
+    macroTileIndexX = x // macroTilePitch
+    macroTileIndexY = y // macroTileHeight
+    macroTileOffset = (macroTileIndexX + macroTilesPerRow * macroTileIndexY) * macroTileBytes
+
+    if tileMode in [8, 9, 10, 11, 14, 15]:
+        bankSwapWidth = computeSurfaceBankSwappedWidth(tileMode, bpp, pitch, 1)
+        swapIndex = macroTilePitch * macroTileIndexX // bankSwapWidth
+        bank ^= np.take(bankSwapOrder, swapIndex & 3)
+
+    totalOffset = elemOffset + ((macroTileOffset + sliceOffset) >> 3)
+    return bank << 9 | pipe << 8 | 255 & totalOffset | (totalOffset & -256) << 3
 
 
 class Flags:
@@ -358,10 +569,6 @@ class surfaceOut:
         self.tileIndex = 0
 
 
-pIn = surfaceIn()
-pOut = surfaceOut()
-
-
 def powTwoAlign(x, align):
     return ~(align - 1) & (x + align - 1)
 
@@ -384,7 +591,7 @@ def getBitsPerPixel(format_):
             formatExInfo[fmtIdx + 2], formatExInfo[fmtIdx + 3])
 
 
-def adjustSurfaceInfo(elemMode, expandX, expandY, bpp, width, height):
+def adjustSurfaceInfo(pIn, elemMode, expandX, expandY, bpp, width, height):
     bBCnFormat = 0
     if bpp and elemMode in [9, 10, 11, 12, 13]:
         bBCnFormat = 1
@@ -433,7 +640,7 @@ def adjustSurfaceInfo(elemMode, expandX, expandY, bpp, width, height):
     return 0
 
 
-def hwlComputeMipLevel():
+def hwlComputeMipLevel(pIn):
     handled = 0
 
     if 49 <= pIn.format <= 55:
@@ -462,7 +669,7 @@ def hwlComputeMipLevel():
     return handled
 
 
-def computeMipLevel():
+def computeMipLevel(pIn):
     slices = 0
     height = 0
     width = 0
@@ -472,7 +679,7 @@ def computeMipLevel():
         pIn.width = powTwoAlign(pIn.width, 4)
         pIn.height = powTwoAlign(pIn.height, 4)
 
-    hwlHandled = hwlComputeMipLevel()
+    hwlHandled = hwlComputeMipLevel(pIn)
     if not hwlHandled and pIn.mipLevel and (pIn.flags.value >> 12) & 1:
         width = max(1, pIn.width >> pIn.mipLevel)
         height = max(1, pIn.height >> pIn.mipLevel)
@@ -625,11 +832,7 @@ def computeSurfaceMipLevelTileMode(baseTileMode, bpp, level, width, height, numS
     return expTileMode
 
 
-def padDimensions(tileMode, padDims, isCube, cubeAsArray, pitchAlign, heightAlign, sliceAlign):
-    global expPitch
-    global expHeight
-    global expNumSlices
-
+def padDimensions(tileMode, padDims, isCube, cubeAsArray, expPitch, pitchAlign, expHeight, heightAlign, expNumSlices, sliceAlign):
     thickness = computeSurfaceThickness(tileMode)
     if not padDims:
         padDims = 3
@@ -686,10 +889,6 @@ def computeSurfaceAlignmentsLinear(tileMode, bpp, flags):
 
 
 def computeSurfaceInfoLinear(tileMode, bpp, numSamples, pitch, height, numSlices, mipLevel, padDims, flags):
-    global expPitch
-    global expHeight
-    global expNumSlices
-
     expPitch = pitch
     expHeight = height
     expNumSlices = numSlices
@@ -724,8 +923,11 @@ def computeSurfaceInfoLinear(tileMode, bpp, numSamples, pitch, height, numSlices
         padDims,
         (flags.value >> 4) & 1,
         (flags.value >> 7) & 1,
+        expPitch,
         pitchAlign,
+        expHeight,
         heightAlign,
+        expNumSlices,
         microTileThickness)
 
     if (flags.value >> 9) & 1 and not mipLevel:
@@ -759,10 +961,6 @@ def computeSurfaceAlignmentsMicroTiled(tileMode, bpp, flags, numSamples):
 
 
 def computeSurfaceInfoMicroTiled(tileMode, bpp, numSamples, pitch, height, numSlices, mipLevel, padDims, flags):
-    global expPitch
-    global expHeight
-    global expNumSlices
-
     expTileMode = tileMode
     expPitch = pitch
     expHeight = height
@@ -801,8 +999,11 @@ def computeSurfaceInfoMicroTiled(tileMode, bpp, numSamples, pitch, height, numSl
         padDims,
         (flags.value >> 4) & 1,
         (flags.value >> 7) & 1,
+        expPitch,
         pitchAlign,
+        expHeight,
         heightAlign,
+        expNumSlices,
         microTileThickness)
 
     pPitchOut = expPitch
@@ -851,10 +1052,6 @@ def computeSurfaceAlignmentsMacroTiled(tileMode, bpp, flags, numSamples):
 
 
 def computeSurfaceInfoMacroTiled(tileMode, baseTileMode, bpp, numSamples, pitch, height, numSlices, mipLevel, padDims, flags):
-    global expPitch
-    global expHeight
-    global expNumSlices
-
     expPitch = pitch
     expHeight = height
     expNumSlices = numSlices
@@ -898,8 +1095,11 @@ def computeSurfaceInfoMacroTiled(tileMode, baseTileMode, bpp, numSamples, pitch,
             padDims,
             (flags.value >> 4) & 1,
             (flags.value >> 7) & 1,
+            expPitch,
             pitchAlign,
+            expHeight,
             heightAlign,
+            expNumSlices,
             microTileThickness)
 
         pPitchOut = expPitch
@@ -952,8 +1152,11 @@ def computeSurfaceInfoMacroTiled(tileMode, baseTileMode, bpp, numSamples, pitch,
                 padDims,
                 (flags.value >> 4) & 1,
                 (flags.value >> 7) & 1,
+                expPitch,
                 pitchAlign,
+                expHeight,
                 heightAlign,
+                expNumSlices,
                 microTileThickness)
 
             pPitchOut = expPitch
@@ -970,7 +1173,7 @@ def computeSurfaceInfoMacroTiled(tileMode, baseTileMode, bpp, numSamples, pitch,
     return result, pPitchOut, pHeightOut, pNumSlicesOut, pSurfSize, pTileModeOut, pBaseAlign, pPitchAlign, pHeightAlign, pDepthAlign
 
 
-def ComputeSurfaceInfoEx():
+def ComputeSurfaceInfoEx(pIn, pOut):
     tileMode = pIn.tileMode
     bpp = pIn.bpp
     numSamples = max(1, pIn.numSamples)
@@ -1066,7 +1269,7 @@ def ComputeSurfaceInfoEx():
     return 0
 
 
-def restoreSurfaceInfo(elemMode, expandX, expandY, bpp):
+def restoreSurfaceInfo(pOut, elemMode, expandX, expandY, bpp):
     if pOut.pixelPitch and pOut.pixelHeight:
         width = pOut.pixelPitch
         height = pOut.pixelHeight
@@ -1101,13 +1304,7 @@ def restoreSurfaceInfo(elemMode, expandX, expandY, bpp):
     return 0
 
 
-def computeSurfaceInfo(aSurfIn, pSurfOut):
-    global pIn
-    global pOut
-
-    pIn = aSurfIn
-    pOut = pSurfOut
-
+def computeSurfaceInfo(pIn, pOut):
     tileInfoNull = tileInfo()
     sliceFlags = 0
     returnCode = 0
@@ -1116,7 +1313,7 @@ def computeSurfaceInfo(aSurfIn, pSurfOut):
         returnCode = 3
 
     if returnCode == 0:
-        computeMipLevel()
+        computeMipLevel(pIn)
 
         width = pIn.width
         height = pIn.height
@@ -1132,7 +1329,7 @@ def computeSurfaceInfo(aSurfIn, pSurfOut):
             if elemMode == 4 and expandX == 3 and pIn.tileMode == 1:
                 pIn.flags.value |= 0x200
 
-            bpp = adjustSurfaceInfo(elemMode, expandX, expandY, bpp, width, height)
+            bpp = adjustSurfaceInfo(pIn, elemMode, expandX, expandY, bpp, width, height)
 
         elif pIn.bpp:
             pIn.width = max(1, pIn.width)
@@ -1142,7 +1339,7 @@ def computeSurfaceInfo(aSurfIn, pSurfOut):
             returnCode = 3
 
         if returnCode == 0:
-            returnCode = ComputeSurfaceInfoEx()
+            returnCode = ComputeSurfaceInfoEx(pIn, pOut)
 
         if returnCode == 0:
             pOut.bpp = pIn.bpp
@@ -1150,7 +1347,7 @@ def computeSurfaceInfo(aSurfIn, pSurfOut):
             pOut.pixelHeight = pOut.height
 
             if pIn.format and (not (pIn.flags.value >> 9) & 1 or not pIn.mipLevel):
-                bpp = restoreSurfaceInfo(elemMode, expandX, expandY, bpp)
+                bpp = restoreSurfaceInfo(pOut, elemMode, expandX, expandY, bpp)
 
             if sliceFlags:
                 if sliceFlags == 1:
@@ -1306,6 +1503,4 @@ def getSurfaceInfo(surfaceFormat, surfaceWidth, surfaceHeight, surfaceDepth, sur
         pSurfOut.size = 96
         computeSurfaceInfo(aSurfIn, pSurfOut)
 
-        pSurfOut = pOut
-
     return pSurfOut
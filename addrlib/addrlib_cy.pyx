@@ -332,12 +332,6 @@ cdef u64 computeSurfaceAddrFromCoordMacroTiled(u32 x, u32 y, u32 bpp, u32 pitch,
     return bank << 9 | pipe << 8 | 255 & totalOffset | (totalOffset & -256) << 3
 
 
-cdef:
-    u32 expPitch = 0
-    u32 expHeight = 0
-    u32 expNumSlices = 0
-
-
 cdef class Flags:
     cdef u32 value
 
@@ -446,11 +440,6 @@ class pyClass:
     pass
 
 
-cdef:
-    surfaceIn pIn = surfaceIn()
-    surfaceOut pOut = surfaceOut()
-
-
 cdef u32 powTwoAlign(u32 x, u32 align):
     return ~(align - 1) & (x + align - 1)
 
@@ -473,7 +462,7 @@ cdef (u32, u32, u32, u32) getBitsPerPixel(u32 format_):
             formatExInfo[fmtIdx + 2], formatExInfo[fmtIdx + 3])
 
 
-cdef u32 adjustSurfaceInfo(u32 elemMode, u32 expandX, u32 expandY, u32 bpp, u32 width, u32 height):
+cdef u32 adjustSurfaceInfo(surfaceIn pIn, u32 elemMode, u32 expandX, u32 expandY, u32 bpp, u32 width, u32 height):
     cdef:
         u32 bBCnFormat = 0
         u32 widtha, heighta
@@ -519,7 +508,7 @@ cdef u32 adjustSurfaceInfo(u32 elemMode, u32 expandX, u32 expandY, u32 bpp, u32
     return 0
 
 
-cdef u32 hwlComputeMipLevel():
+cdef u32 hwlComputeMipLevel(surfaceIn pIn):
     cdef:
         u32 width, widtha
         u32 height, heighta
@@ -553,7 +542,7 @@ cdef u32 hwlComputeMipLevel():
     return handled
 
 
-cdef void computeMipLevel():
+cdef void computeMipLevel(surfaceIn pIn):
     cdef:
         u32 slices = 0
         u32 height = 0
@@ -564,7 +553,7 @@ cdef void computeMipLevel():
         pIn.width = powTwoAlign(pIn.width, 4)
         pIn.height = powTwoAlign(pIn.height, 4)
 
-    hwlHandled = hwlComputeMipLevel()
+    hwlHandled = hwlComputeMipLevel(pIn)
     if not hwlHandled and pIn.mipLevel and (pIn.flags.value >> 12) & 1:
         width = max(1, pIn.width >> pIn.mipLevel)
         height = max(1, pIn.height >> pIn.mipLevel)
@@ -723,11 +712,7 @@ cdef u32 computeSurfaceMipLevelTileMode(u32 baseTileMode, u32 bpp, u32 level, u3
     return expTileMode
 
 
-cdef (u32, u32, u32) padDimensions(u32 tileMode, u32 padDims, u32 isCube, u32 cubeAsArray, u32 pitchAlign, u32 heightAlign, u32 sliceAlign):
-    global expPitch
-    global expHeight
-    global expNumSlices
-
+cdef (u32, u32, u32) padDimensions(u32 tileMode, u32 padDims, u32 isCube, u32 cubeAsArray, u32 expPitch, u32 pitchAlign, u32 expHeight, u32 heightAlign, u32 expNumSlices, u32 sliceAlign):
     cdef u32 thickness = computeSurfaceThickness(tileMode)
     if not padDims:
         padDims = 3
@@ -788,9 +773,6 @@ cdef (u32, u32, u32) computeSurfaceAlignmentsLinear(u32 tileMode, u32 bpp, Flags
 
 
 cdef (u32, u32, u32, u32, u32, u32, u32, u32, u32) computeSurfaceInfoLinear(u32 tileMode, u32 bpp, u32 numSamples, u32 pitch, u32 height, u32 numSlices, u32 mipLevel, u32 padDims, Flags flags):
-    global expPitch
-    global expHeight
-    global expNumSlices
 
     expPitch = pitch
     expHeight = height
@@ -830,8 +812,11 @@ cdef (u32, u32, u32, u32, u32, u32, u32, u32, u32) computeSurfaceInfoLinear(u32
         padDims,
         (flags.value >> 4) & 1,
         (flags.value >> 7) & 1,
+        expPitch,
         pitchAlign,
+        expHeight,
         heightAlign,
+        expNumSlices,
         microTileThickness)
 
     if (flags.value >> 9) & 1 and not mipLevel:
@@ -866,9 +851,6 @@ cdef (u32, u32, u32) computeSurfaceAlignmentsMicroTiled(u32 tileMode, u32 bpp, F
 
 
 cdef (u32, u32, u32, u32, u32, u32, u32, u32, u32, u32) computeSurfaceInfoMicroTiled(u32 tileMode, u32 bpp, u32 numSamples, u32 pitch, u32 height, u32 numSlices, u32 mipLevel, u32 padDims, Flags flags):
-    global expPitch
-    global expHeight
-    global expNumSlices
 
     expPitch = pitch
     expHeight = height
@@ -910,8 +892,11 @@ cdef (u32, u32, u32, u32, u32, u32, u32, u32, u32, u32) computeSurfaceInfoMicroT
         padDims,
         (flags.value >> 4) & 1,
         (flags.value >> 7) & 1,
+        expPitch,
         pitchAlign,
+        expHeight,
         heightAlign,
+        expNumSlices,
         microTileThickness)
 
     pPitchOut = expPitch
@@ -967,9 +952,6 @@ cdef (u32, u32, u32, u32, u32) computeSurfaceAlignmentsMacroTiled(u32 tileMode,
 
 
 cdef (u32, u32, u32, u32, u32, u32, u32, u32, u32, u32) computeSurfaceInfoMacroTiled(u32 tileMode, u32 baseTileMode, u32 bpp, u32 numSamples, u32 pitch, u32 height, u32 numSlices, u32 mipLevel, u32 padDims, Flags flags):
-    global expPitch
-    global expHeight
-    global expNumSlices
 
     expPitch = pitch
     expHeight = height
@@ -1019,8 +1001,11 @@ cdef (u32, u32, u32, u32, u32, u32, u32, u32, u32, u32) computeSurfaceInfoMacroT
             padDims,
             (flags.value >> 4) & 1,
             (flags.value >> 7) & 1,
+            expPitch,
             pitchAlign,
+            expHeight,
             heightAlign,
+            expNumSlices,
             microTileThickness)
 
         pPitchOut = expPitch
@@ -1073,8 +1058,11 @@ cdef (u32, u32, u32, u32, u32, u32, u32, u32, u32, u32) computeSurfaceInfoMacroT
                 padDims,
                 (flags.value >> 4) & 1,
                 (flags.value >> 7) & 1,
+                expPitch,
                 pitchAlign,
+                expHeight,
                 heightAlign,
+                expNumSlices,
                 microTileThickness)
 
             pPitchOut = expPitch
@@ -1091,7 +1079,7 @@ cdef (u32, u32, u32, u32, u32, u32, u32, u32, u32, u32) computeSurfaceInfoMacroT
     return result, pPitchOut, pHeightOut, pNumSlicesOut, pSurfSize, pTileModeOut, pBaseAlign, pPitchAlign, pHeightAlign, pDepthAlign
 
 
-cdef u32 ComputeSurfaceInfoEx():
+cdef u32 ComputeSurfaceInfoEx(surfaceIn pIn, surfaceOut pOut):
     cdef:
         u32 tileMode = pIn.tileMode
         u32 bpp = pIn.bpp
@@ -1189,7 +1177,7 @@ cdef u32 ComputeSurfaceInfoEx():
     return 0
 
 
-cdef u32 restoreSurfaceInfo(u32 elemMode, u32 expandX, u32 expandY, u32 bpp):
+cdef u32 restoreSurfaceInfo(surfaceOut pOut, u32 elemMode, u32 expandX, u32 expandY, u32 bpp):
     cdef u32 width, height
 
     if pOut.pixelPitch and pOut.pixelHeight:
@@ -1226,13 +1214,7 @@ cdef u32 restoreSurfaceInfo(u32 elemMode, u32 expandX, u32 expandY, u32 bpp):
     return 0
 
 
-cdef void computeSurfaceInfo(surfaceIn aSurfIn, surfaceOut pSurfOut):
-    global pIn
-    global pOut
-
-    pIn = aSurfIn
-    pOut = pSurfOut
-
+cdef void computeSurfaceInfo(surfaceIn pIn, surfaceOut pOut):
     cdef:
         tileInfo tileInfoNull = tileInfo()
         u32 sliceFlags = 0
@@ -1245,7 +1227,7 @@ cdef void computeSurfaceInfo(surfaceIn aSurfIn, surfaceOut pSurfOut):
         returnCode = 3
 
     if returnCode == 0:
-        computeMipLevel()
+        computeMipLevel(pIn)
 
         width = pIn.width
         height = pIn.height
@@ -1261,7 +1243,7 @@ cdef void computeSurfaceInfo(surfaceIn aSurfIn, surfaceOut pSurfOut):
             if elemMode == 4 and expandX == 3 and pIn.tileMode == 1:
                 pIn.flags.value |= 0x200
 
-            bpp = adjustSurfaceInfo(elemMode, expandX, expandY, bpp, width, height)
+            bpp = adjustSurfaceInfo(pIn, elemMode, expandX, expandY, bpp, width, height)
 
         elif pIn.bpp:
             pIn.width = max(1, pIn.width)
@@ -1271,7 +1253,7 @@ cdef void computeSurfaceInfo(surfaceIn aSurfIn, surfaceOut pSurfOut):
             returnCode = 3
 
         if returnCode == 0:
-            returnCode = ComputeSurfaceInfoEx()
+            returnCode = ComputeSurfaceInfoEx(pIn, pOut)
 
         if returnCode == 0:
             pOut.bpp = pIn.bpp
@@ -1279,7 +1261,7 @@ cdef void computeSurfaceInfo(surfaceIn aSurfIn, surfaceOut pSurfOut):
             pOut.pixelHeight = pOut.height
 
             if pIn.format and (not (pIn.flags.value >> 9) & 1 or not pIn.mipLevel):
-                bpp = restoreSurfaceInfo(elemMode, expandX, expandY, bpp)
+                bpp = restoreSurfaceInfo(pOut, elemMode, expandX, expandY, bpp)
 
             if sliceFlags:
                 if sliceFlags == 1:
@@ -1436,8 +1418,6 @@ def getSurfaceInfo(u32 surfaceFormat, u32 surfaceWidth, u32 surfaceHeight, u32 s
         pSurfOut.size = 96
         computeSurfaceInfo(aSurfIn, pSurfOut)
 
-        pSurfOut = pOut
-
     # We can't return a Cython class
     # Copy the attributes from our Cython class to a Python class
     # and return it instead
@@ -0,0 +1,217 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Metamaker - A low-level Super Mario Maker course editor
+# Version 0.1.0
+# Copyright (C) 2009-2019 Treeki, Tempus, angelsl, JasonP27, Kamek64,
+# MalStar1000, RoadrunnerWMC, AboodXD
+
+# This file is part of Metamaker.
+
+# Metamaker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Metamaker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Metamaker.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+# assetindex.py
+# Keeps an index of the files in a Model/ or Pack/ folder (and the
+# textures inside them), saved to disk so it only needs updating for
+# files that changed since the last run
+
+
+################################################################
+################################################################
+
+# Imports
+
+import json
+import os
+import tempfile
+import threading
+
+
+INDEX_VERSION = 1
+EXTENSIONS = {'.sarc': False, '.szs': True} # extension: compressed?
+
+
+class AssetIndex():
+    """
+    Index of the .sarc/.szs files in one folder. Each entry records the
+    file name, whether it's Yaz0-compressed, its size and mtime, and the
+    names of the textures inside it (None until it has been scanned).
+    """
+    def __init__(self, folder, indexPath):
+        """
+        Initializes the index and loads the saved copy, if any
+        """
+        self.folder = folder
+        self.indexPath = indexPath
+        self.entries = {}
+        self.textureIndex = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+
+        self.load()
+
+
+    def load(self):
+        """
+        Loads the saved index from self.indexPath, ignoring it if it's
+        missing, unreadable or for a different folder
+        """
+        try:
+            with open(self.indexPath, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if saved.get('version') != INDEX_VERSION or saved.get('folder') != self.folder:
+            return
+
+        self.entries = saved['entries']
+        self.rebuildTextureIndex()
+
+
+    def save(self):
+        """
+        Writes the index to self.indexPath if anything changed. Failing
+        to write it isn't an error; it'll just be rebuilt next time.
+        """
+        with self.lock:
+            if not self.dirty: return
+
+            data = {
+                'version': INDEX_VERSION,
+                'folder': self.folder,
+                'entries': self.entries,
+                }
+            self.dirty = False
+
+        tempPath = None
+        try:
+            # A unique temp file, so several editors can save at once
+            folder = os.path.dirname(self.indexPath)
+            os.makedirs(folder, exist_ok=True)
+            fd, tempPath = tempfile.mkstemp(dir=folder, suffix='.tmp')
+            with open(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tempPath, self.indexPath)
+        except OSError as e:
+            print('Could not save %s: %s' % (self.indexPath, e))
+            if tempPath is not None:
+                try: os.remove(tempPath)
+                except OSError: pass
+            with self.lock:
+                self.dirty = True
+
+
+    def refresh(self):
+        """
+        Re-stats the folder. Unchanged files keep their saved entries;
+        new or modified ones are added with textures = None so they get
+        rescanned. Returns the number of entries that changed.
+        """
+        found = {}
+        if self.folder and os.path.isdir(self.folder):
+            with os.scandir(self.folder) as it:
+                for dirEntry in it:
+                    name, ext = os.path.splitext(dirEntry.name)
+                    if ext.lower() not in EXTENSIONS or not dirEntry.is_file(): continue
+
+                    # Uncompressed files win if both exist, same as the loader
+                    if name in found and not found[name]['compressed']: continue
+
+                    stat = dirEntry.stat()
+                    found[name] = {
+                        'file': dirEntry.name,
+                        'compressed': EXTENSIONS[ext.lower()],
+                        'size': stat.st_size,
+                        'mtime': stat.st_mtime,
+                        'textures': None,
+                        }
+
+        changed = 0
+        with self.lock:
+            for name, entry in found.items():
+                old = self.entries.get(name)
+                if old is not None and all(old[k] == entry[k] for k in ('file', 'size', 'mtime')):
+                    found[name] = old
+                else:
+                    changed += 1
+
+            changed += len(self.entries.keys() - found.keys())
+
+            if changed:
+                self.entries = found
+                self.dirty = True
+
+        if changed:
+            self.rebuildTextureIndex()
+
+        return changed
+
+
+    def rebuildTextureIndex(self):
+        """
+        Rebuilds the texture name -> file name mapping
+        """
+        textureIndex = {}
+        for name, entry in self.entries.items():
+            for texture in entry['textures'] or ():
+                textureIndex.setdefault(texture, name)
+
+        self.textureIndex = textureIndex
+
+
+    def __contains__(self, name):
+        return name in self.entries
+
+
+    def path(self, name):
+        """
+        Returns (full path, compressed?) for a file name (without
+        extension), or None if it isn't in the folder
+        """
+        entry = self.entries.get(name)
+        if entry is None: return None
+        return os.path.join(self.folder, entry['file']), entry['compressed']
+
+
+    def findTexture(self, texture):
+        """
+        Returns the name of the file that contains a texture, or None if
+        it isn't known
+        """
+        return self.textureIndex.get(texture)
+
+
+    def unscanned(self):
+        """
+        Returns the names of the files whose textures haven't been
+        recorded yet
+        """
+        return [name for name, entry in self.entries.items() if entry['textures'] is None]
+
+
+    def setTextures(self, name, textures):
+        """
+        Records the names of the textures inside a file
+        """
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None or entry['textures'] == textures: return
+            entry['textures'] = list(textures)
+            self.dirty = True
+
+        for texture in textures:
+            self.textureIndex.setdefault(texture, name)
@@ -0,0 +1,182 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Metamaker - A low-level Super Mario Maker course editor
+# Version 0.1.0
+# Copyright (C) 2009-2019 Treeki, Tempus, angelsl, JasonP27, Kamek64,
+# MalStar1000, RoadrunnerWMC, AboodXD
+
+# This file is part of Metamaker.
+
+# Metamaker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Metamaker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Metamaker.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+# autosave.py
+# Writes autosaved course data on a background thread, so that the editor
+# never has to wait for it
+
+
+################################################################
+################################################################
+
+# Imports
+
+import os
+import struct
+import threading
+import time
+import traceback
+import zlib
+
+
+AUTOSAVE_MAGIC = b'MMAS'
+
+# Passed instead of a snapshot to delete the autosave
+CLEAR = object()
+
+
+class AutoSaver():
+    """
+    Saves snapshots of a course to a file on a worker thread. Only the
+    most recent snapshot is kept while waiting, so snapshots that come
+    in faster than they can be written (or faster than minInterval
+    allows) just replace each other.
+    """
+    def __init__(self, path, minInterval=5):
+        """
+        Initializes the autosaver and starts its thread
+        """
+        self.path = path
+        self.minInterval = minInterval # seconds between writes
+        self.lastWrite = None
+
+        self.pending = None
+        self.stopping = False
+        self.condition = threading.Condition()
+
+        self.thread = threading.Thread(target=self.run, name='AutoSaver', daemon=True)
+        self.thread.start()
+
+
+    def save(self, snapshot, coursePath):
+        """
+        Queues a course snapshot to be autosaved. snapshot must have a
+        save() method that returns the course data, and must not be
+        changed after it's passed in; it's called on the worker thread.
+        """
+        with self.condition:
+            self.pending = (snapshot, coursePath)
+            self.condition.notify()
+
+
+    def clear(self):
+        """
+        Queues the autosave to be deleted, cancelling any waiting snapshot
+        """
+        with self.condition:
+            self.pending = CLEAR
+            self.condition.notify()
+
+
+    def stop(self, timeout=None):
+        """
+        Finishes any queued work (without waiting for minInterval) and
+        stops the thread
+        """
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        self.thread.join(timeout)
+
+
+    def run(self):
+        """
+        The worker thread
+        """
+        while True:
+            with self.condition:
+                while self.pending is None and not self.stopping:
+                    self.condition.wait()
+                if self.pending is None: return
+
+                # Don't write more often than every minInterval seconds.
+                # Anything queued in the meantime replaces self.pending.
+                if self.pending is not CLEAR and self.lastWrite is not None and not self.stopping:
+                    wait = self.lastWrite + self.minInterval - time.monotonic()
+                    if wait > 0:
+                        self.condition.wait(wait)
+                        continue
+
+                job, self.pending = self.pending, None
+
+            try:
+                if job is CLEAR:
+                    self.remove()
+                else:
+                    self.write(*job)
+            except Exception:
+                traceback.print_exc()
+
+
+    def write(self, snapshot, coursePath):
+        """
+        Saves, compresses and writes a snapshot. The file is written
+        under a temporary name first and then renamed over the old one,
+        so a crash while writing never leaves a broken autosave.
+        """
+        pathData = (coursePath or '').encode('utf-8')
+        data = zlib.compress(snapshot.save())
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tempPath = self.path + '.tmp'
+        with open(tempPath, 'wb') as f:
+            f.write(AUTOSAVE_MAGIC + struct.pack('>H', len(pathData)) + pathData)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tempPath, self.path)
+
+        self.lastWrite = time.monotonic()
+
+
+    def remove(self):
+        """
+        Deletes the autosave, if there is one
+        """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+    @staticmethod
+    def load(path):
+        """
+        Reads an autosave, returning (course path, course data), or None
+        if there isn't one (or it can't be read). The course path is
+        None if the course was never saved.
+        """
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+
+            if raw[:4] != AUTOSAVE_MAGIC: return None
+            pathLen, = struct.unpack_from('>H', raw, 4)
+            coursePath = raw[6:6 + pathLen].decode('utf-8') or None
+            data = zlib.decompress(raw[6 + pathLen:])
+        except (OSError, ValueError, struct.error, zlib.error):
+            return None
+
+        return coursePath, data
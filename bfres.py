@@ -303,5 +303,17 @@ def texToQImage(tex):
         format_ = 'rgba8'
         bpp = 4
 
-    data = formConv.torgba8(tex.width, tex.height, bytearray(data), format_, bpp, tex.compSel2)
-    return QImage(data, tex.width, tex.height, QImage.Format_RGBA8888)
+    # Write the final RGBA8 data straight into memory owned by the image
+    img = QImage(tex.width, tex.height, QImage.Format_RGBA8888)
+    bits = img.bits()
+    bits.setsize(img.byteCount())
+    out = memoryview(bits)
+
+    if format_ == 'rgba8':
+        # Already RGBA8, so only the component selectors need applying
+        formConv.applyCompSel(tex.width, tex.height, data, tex.compSel2, out)
+
+    else:
+        formConv.torgba8(tex.width, tex.height, data, format_, bpp, tex.compSel2, out)
+
+    return img
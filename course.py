@@ -0,0 +1,706 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Metamaker - A low-level Super Mario Maker course editor
+# Version 0.1.0
+# Copyright (C) 2009-2019 Treeki, Tempus, angelsl, JasonP27, Kamek64,
+# MalStar1000, RoadrunnerWMC, AboodXD
+
+# This file is part of Metamaker.
+
+# Metamaker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Metamaker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Metamaker.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+# course.py
+# Reads, writes and validates Super Mario Maker course data (.cdt files).
+# Nothing in here depends on Qt, so it can be used without a GUI.
+
+
+################################################################
+################################################################
+
+# Imports
+
+import binascii
+import struct
+
+HAS_NUMPY = True
+try:
+    import numpy as np
+except ImportError:
+    HAS_NUMPY = False
+import sarc as SarcLib
+import yaz0
+
+
+COURSE_VERSION = 0xB
+COURSE_SIZE = 0x15000
+
+SPRITES_OFFSET = 0xF0
+SPRITE_SIZE = 32
+MAX_SPRITES = 2600
+EFFECTS_OFFSET = 0x145F0
+EFFECT_SIZE = 8
+NUM_EFFECTS = 300
+FOOTER_OFFSET = 0x14F50
+
+STYLES = [b'M1', b'M3', b'MW', b'WU']
+
+DEFAULT_SPRITEDATA = b'\x06\0\x08@\0\0\0\0'
+DEFAULT_SUBSPRITEDATA = b'\x06\0\x08@'
+DEFAULT_EFFECT = b'\xFF\xFF\0\xFF\xFF\0\0\0'
+
+# Course attributes that are saved in the header, in order
+HEADER_FIELDS = ('creationYear', 'creationMonth', 'creationDay',
+    'creationHour', 'creationMinute', 'unk16', 'unk17', 'unk181F', 'unk20',
+    'courseName', 'style', 'unk6C', 'theme', 'unk6E', 'unk6F', 'timeLimit',
+    'autoscroll', 'unk73', 'unk7475', 'unk76D7', 'unkD8DB', 'unkDCDF')
+
+headerStruct = struct.Struct('>QI4xH6BQB7x66s2s4BHBBI96sII12xI')
+spriteStruct = struct.Struct('>IIhbb4s4s4sbbhhbb')
+effectStruct = struct.Struct('>5bxxx')
+NUM_ITEMS_OFFSET = 0xEC # the last field in the header
+EFFECT_INDEX_OFFSET = 28 # within a sprite
+
+if HAS_NUMPY:
+    # The same layout as spriteStruct, as a NumPy structured dtype
+    spriteDtype = np.dtype([
+        ('x', '>u4'),
+        ('z', '>u4'),
+        ('y', '>i2'),
+        ('width', 'i1'),
+        ('height', 'i1'),
+        ('spritedata', 'S4'),
+        ('spritedata_sub', 'S4'),
+        ('spritedata2', 'S4'),
+        ('type', 'i1'),
+        ('type_sub', 'i1'),
+        ('linkingID', '>i2'),
+        ('effIdx', '>i2'),
+        ('costumeID', 'i1'),
+        ('costumeID_sub', 'i1'),
+        ])
+    assert spriteDtype.itemsize == SPRITE_SIZE
+
+
+class Effect:
+    """
+    An effect you can place in your level.
+    """
+    __slots__ = ('unk00', 'unk01', 'unk02', 'unk03', 'unk04')
+
+    def __init__(self, unk00, unk01, unk02, unk03, unk04):
+        """
+        Initializes the effect with the parameters given
+        """
+        self.unk00 = unk00
+        self.unk01 = unk01
+        self.unk02 = unk02
+        self.unk03 = unk03
+        self.unk04 = unk04
+
+
+    def pack(self):
+        """
+        Returns the effect as bytes
+        """
+        return effectStruct.pack(self.unk00, self.unk01, self.unk02, self.unk03, self.unk04)
+
+
+class SpriteRecord:
+    """
+    A sprite in a course, without anything needed to display it.
+
+    Like metamaker's SpriteItem, self.record is the packed sprite this
+    was loaded from (or last saved as), which Course.save() copies
+    as-is instead of packing the sprite again. Unlike SpriteItem,
+    changing any attribute here calls markDirty() automatically.
+    """
+    __slots__ = ('objx', 'objz', 'objy', 'width', 'height',
+        'spritedata', 'spritedata_sub', 'type', 'type_sub',
+        'linkingID', 'effect', 'costumeID', 'costumeID_sub', 'record')
+
+    # Default argument values are the ones the game uses
+    def __init__(self,
+        x=0, z=0, y=0,
+        w=1, h=1,
+        sprdata=DEFAULT_SPRITEDATA[:4], subsprdata=DEFAULT_SUBSPRITEDATA, sprdata2=DEFAULT_SPRITEDATA[4:],
+        type_=0, subtype=-1,
+        linkingid=-1, eff=None, costumeid=-1, subcostumeid=-1,
+        ):
+        """
+        Create a sprite with specific data
+        """
+        self.objx = x
+        self.objz = z
+        self.objy = y
+        self.width = w
+        self.height = h
+        self.spritedata = sprdata + sprdata2
+        self.spritedata_sub = subsprdata
+        self.type = type_
+        self.type_sub = subtype
+        self.linkingID = linkingid
+        self.effect = eff
+        self.costumeID = costumeid
+        self.costumeID_sub = subcostumeid
+        self.record = None
+
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name != 'record': super().__setattr__('record', None)
+
+
+    def markDirty(self):
+        """
+        Marks the sprite as changed, so it's packed again when saved
+        """
+        self.record = None
+
+
+    def args(self):
+        """
+        Returns the arguments the sprite was created with, which can be
+        passed to SpriteRecord() (or metamaker's SpriteItem()) to copy it
+        """
+        return spriteArgs(self)
+
+
+class PackedSprite:
+    """
+    An unchanged sprite in a course snapshot, which is saved by copying
+    its packed record
+    """
+    __slots__ = ('record', 'effect')
+
+    def __init__(self, record, effect):
+        self.record = record
+        self.effect = effect
+
+
+def spriteArgs(spr):
+    """
+    Returns the arguments to create a copy of a sprite (anything with
+    the same attributes as a SpriteRecord)
+    """
+    return (
+        spr.objx, spr.objz, spr.objy,
+        spr.width, spr.height,
+        spr.spritedata[:4], spr.spritedata_sub, spr.spritedata[4:],
+        spr.type, spr.type_sub,
+        spr.linkingID, spr.effect, spr.costumeID, spr.costumeID_sub,
+        )
+
+
+def unpackSprite(data, i, effects):
+    """
+    Returns the arguments for sprite i in the course data, with the
+    effect index replaced by the Effect object itself
+    """
+    sprinfo = list(spriteStruct.unpack_from(data, SPRITES_OFFSET + SPRITE_SIZE * i))
+
+    # Replace the effect index with the Effect object itself
+    sprinfo[11] = None if sprinfo[11] == -1 else effects[sprinfo[11] % NUM_EFFECTS]
+
+    # Fix up the positions
+    sprinfo[0] = sprinfo[0] // 10 - 8
+    sprinfo[1] = sprinfo[1] // 10
+    sprinfo[2] = sprinfo[2] // 10 - 8
+
+    return sprinfo
+
+
+def packSpriteInto(buffer, offset, spr, effIdx):
+    """
+    Writes a sprite (anything with the same attributes as a
+    SpriteRecord) into buffer at offset
+    """
+    spriteStruct.pack_into(buffer, offset,
+        spr.objx * 10 + 80,
+        spr.objz * 10,
+        spr.objy * 10 + 80,
+        spr.width,
+        spr.height,
+        spr.spritedata[:4],
+        spr.spritedata_sub,
+        spr.spritedata[4:],
+        spr.type,
+        spr.type_sub,
+        spr.linkingID,
+        effIdx,
+        spr.costumeID,
+        spr.costumeID_sub,
+        )
+
+
+def courseHash(data):
+    """
+    Returns the CRC32 hash of some course data, as stored in its header
+    """
+    return binascii.crc32(memoryview(data)[16:]) & 0xFFFFFFFF
+
+
+class Course:
+    """
+    A Super Mario Maker course, as plain data
+    """
+    def __init__(self):
+        """
+        Initializes the course
+        """
+        super().__init__()
+        self.sprites = []
+
+
+    def makeSprite(self, sprinfo):
+        """
+        Creates a sprite object from the arguments unpackSprite() returns.
+        Subclasses can override this to use their own sprite class.
+        """
+        return SpriteRecord(*sprinfo)
+
+
+    def load(self, data, progress=None):
+        """
+        Loads a Super Mario Maker course from bytes data.
+        """
+
+        header = headerStruct.unpack_from(data, 0)
+
+        def parseStyle(raw):
+            return STYLES.index(raw) if raw in STYLES else 0
+
+        courseVer = header[0]; assert courseVer == COURSE_VERSION
+        # header[1] is the CRC32 hash; we don't need to load this
+        self.creationYear = header[2]
+        self.creationMonth = header[3]
+        self.creationDay = header[4]
+        self.creationHour = header[5]
+        self.creationMinute = header[6]
+        self.unk16 = header[7]
+        self.unk17 = header[8]
+        self.unk181F = header[9]
+        self.unk20 = header[10]
+        self.courseName = header[11].rstrip(b'\0').decode('utf-16be')
+        self.style = parseStyle(header[12])
+        self.unk6C = header[13]
+        self.theme = header[14] % 6
+        self.unk6E = header[15]
+        self.unk6F = header[16]
+        self.timeLimit = header[17]
+        self.autoscroll = header[18]
+        self.unk73 = header[19]
+        self.unk7475 = header[20]
+        self.unk76D7 = header[21] # this reeeeeally needs to be figured out ASAP
+        self.unkD8DB = header[22]
+        self.unkDCDF = header[23]
+        numItems = header[24]
+
+
+        effects = []
+        for i in range(NUM_EFFECTS):
+            effinfo = effectStruct.unpack_from(data, EFFECTS_OFFSET + EFFECT_SIZE * i)
+            effects.append(Effect(*effinfo))
+
+
+        self.sprites = []
+        for i in range(numItems):
+            spr = self.makeSprite(unpackSprite(data, i, effects))
+
+            offset = SPRITES_OFFSET + SPRITE_SIZE * i
+            spr.record = bytes(data[offset:offset + SPRITE_SIZE])
+            self.sprites.append(spr)
+
+
+        # Success return value
+        return True
+
+
+    def snapshot(self):
+        """
+        Returns a copy of the course that can be saved on another thread
+        while this one keeps changing. Unchanged sprites are copied as
+        just their packed records, so this is cheap.
+        """
+        copy = Course()
+        for name in HEADER_FIELDS:
+            setattr(copy, name, getattr(self, name))
+
+        for spr in self.sprites:
+            if spr.record is not None:
+                copy.sprites.append(PackedSprite(spr.record, spr.effect))
+            else:
+                copy.sprites.append(SpriteRecord(*spriteArgs(spr)))
+
+        return copy
+
+
+    def save(self):
+        """
+        Save the course back to a file. Only sprites that have changed
+        since they were loaded or last saved are packed again.
+        """
+        if len(self.sprites) > MAX_SPRITES:
+            raise ValueError('Courses can only have up to %d sprites' % MAX_SPRITES)
+
+        cdt = bytearray(COURSE_SIZE)
+
+        headerStruct.pack_into(cdt, 0,
+            COURSE_VERSION,
+            0, # we can't calculate the hash yet; we fill it in later
+            self.creationYear,
+            self.creationMonth,
+            self.creationDay,
+            self.creationHour,
+            self.creationMinute,
+            self.unk16,
+            self.unk17,
+            self.unk181F,
+            self.unk20,
+            self.courseName.encode('utf-16be').ljust(66, b'\0'),
+            STYLES[self.style % 4],
+            self.unk6C,
+            self.theme,
+            self.unk6E,
+            self.unk6F,
+            self.timeLimit,
+            self.autoscroll,
+            self.unk73,
+            self.unk7475,
+            self.unk76D7,
+            self.unkD8DB,
+            self.unkDCDF,
+            len(self.sprites),
+            )
+
+
+        # Sprites that haven't changed since they were loaded or last
+        # saved are copied as-is, so the effects they use have to stay
+        # in the same slots. effects holds the packed effect in each slot
+        # (or None if it's unused).
+        effects = [None] * NUM_EFFECTS
+        dirty = []
+        offset = SPRITES_OFFSET
+        for spr in self.sprites:
+            record = spr.record
+
+            if record is None:
+                dirty.append((offset, spr))
+            else:
+                cdt[offset:offset + SPRITE_SIZE] = record
+
+                effIdx = struct.unpack_from('>h', record, EFFECT_INDEX_OFFSET)[0]
+                if effIdx != -1 and effects[effIdx % NUM_EFFECTS] is None:
+                    effects[effIdx % NUM_EFFECTS] = spr.effect.pack()
+
+            offset += SPRITE_SIZE
+
+        # Changed sprites share an effect slot with any other sprite
+        # that has an identical effect, or take the first free one
+        effectIndices = {}
+        for i, b in enumerate(effects):
+            if b is not None: effectIndices.setdefault(b, i)
+        freeSlot = 0
+
+        for offset, spr in dirty:
+
+            if spr.effect is None:
+                thisEffIdx = -1
+            else:
+                b = spr.effect.pack()
+                thisEffIdx = effectIndices.get(b)
+
+                if thisEffIdx is None:
+                    while freeSlot < NUM_EFFECTS and effects[freeSlot] is not None:
+                        freeSlot += 1
+                    if freeSlot == NUM_EFFECTS:
+                        raise ValueError('Courses can only have up to %d different effects' % NUM_EFFECTS)
+
+                    thisEffIdx = effectIndices[b] = freeSlot
+                    effects[freeSlot] = b
+
+            packSpriteInto(cdt, offset, spr, thisEffIdx)
+            spr.record = bytes(cdt[offset:offset + SPRITE_SIZE])
+
+        cdt[EFFECTS_OFFSET:FOOTER_OFFSET] = b''.join(DEFAULT_EFFECT if b is None else b for b in effects)
+
+        # Shamelessly splice the hash into the cdt
+        struct.pack_into('>I', cdt, 8, courseHash(cdt))
+
+        return bytes(cdt)
+
+
+class SpriteTable:
+    """
+    A view of the sprite table in some course data as a NumPy structured
+    array (one row per sprite, one column per field), so that queries
+    and edits over many sprites can be done as array operations. No
+    data is copied: if the course data is a bytearray, changes to the
+    table change the course data directly.
+    """
+    def __init__(self, data):
+        """
+        Creates a view of the sprites in the course data
+        """
+        if not HAS_NUMPY:
+            raise RuntimeError('SpriteTable requires NumPy')
+
+        numItems = min(struct.unpack_from('>I', data, NUM_ITEMS_OFFSET)[0], MAX_SPRITES)
+
+        self.data = data
+        self.sprites = np.frombuffer(data, spriteDtype, numItems, SPRITES_OFFSET)
+
+
+    def __len__(self):
+        return len(self.sprites)
+
+
+    # Positions with the same fix-ups as unpackSprite(); these return
+    # new arrays, so use moveTo() or translate() to change them
+    @property
+    def objx(self):
+        return self.sprites['x'].astype(np.int64) // 10 - 8
+    @property
+    def objz(self):
+        return self.sprites['z'].astype(np.int64) // 10
+    @property
+    def objy(self):
+        return self.sprites['y'].astype(np.int64) // 10 - 8
+
+
+    def select(self, type=None, xmin=None, xmax=None, ymin=None, ymax=None):
+        """
+        Returns the indices of the sprites of the given type and within
+        the given (inclusive) position range. Any argument can be left
+        as None to not filter by it.
+        """
+        mask = np.ones(len(self.sprites), bool)
+        if type is not None:
+            mask &= self.sprites['type'] == type
+
+        if xmin is not None or xmax is not None:
+            objx = self.objx
+            if xmin is not None: mask &= objx >= xmin
+            if xmax is not None: mask &= objx <= xmax
+
+        if ymin is not None or ymax is not None:
+            objy = self.objy
+            if ymin is not None: mask &= objy >= ymin
+            if ymax is not None: mask &= objy <= ymax
+
+        return np.flatnonzero(mask)
+
+
+    def moveTo(self, indices, objx=None, objy=None):
+        """
+        Moves the sprites at the given indices (or all sprites, if
+        indices is None) to new positions. objx and objy can be single
+        values or arrays with one value per sprite.
+        """
+        if indices is None: indices = slice(None)
+
+        if objx is not None:
+            self.setColumn('x', indices, (np.asarray(objx, np.int64) + 8) * 10)
+        if objy is not None:
+            self.setColumn('y', indices, (np.asarray(objy, np.int64) + 8) * 10)
+
+
+    def translate(self, dx=0, dy=0, indices=None):
+        """
+        Moves the sprites at the given indices (or all sprites, if
+        indices is None) by (dx, dy)
+        """
+        if indices is None: indices = slice(None)
+
+        if dx:
+            self.setColumn('x', indices, self.sprites['x'][indices].astype(np.int64) + dx * 10)
+        if dy:
+            self.setColumn('y', indices, self.sprites['y'][indices].astype(np.int64) + dy * 10)
+
+
+    def setColumn(self, name, indices, values):
+        """
+        Sets a column for the sprites at the given indices, raising
+        ValueError instead of wrapping around if a value doesn't fit
+        """
+        info = np.iinfo(spriteDtype[name])
+        values = np.asarray(values)
+        if values.size and (values.min() < info.min or values.max() > info.max):
+            raise ValueError('%s is out of range for some sprites' % name)
+
+        self.sprites[name][indices] = values
+
+
+    def records(self, indices=None):
+        """
+        Returns the sprites at the given indices (or all sprites) as
+        SpriteRecords
+        """
+        effects = [Effect(*effectStruct.unpack_from(self.data, EFFECTS_OFFSET + EFFECT_SIZE * i)) for i in range(NUM_EFFECTS)]
+
+        if indices is None: indices = range(len(self.sprites))
+
+        records = []
+        for i in indices:
+            spr = SpriteRecord(*unpackSprite(self.data, int(i), effects))
+            spr.record = self.sprites[i].tobytes()
+            records.append(spr)
+
+        return records
+
+
+    def updateHash(self):
+        """
+        Recalculates the hash in the course data's header, after the
+        table has been changed
+        """
+        struct.pack_into('>I', self.data, 8, courseHash(self.data))
+
+
+def isValidCourseData(data):
+    """
+    Returns True if data looks like an uncompressed course (.cdt)
+    """
+
+    # Check some basic things and padding areas
+    if len(data) != COURSE_SIZE: return False
+    if data[:8] != b'\0\0\0\0\0\0\0\x0B': return False
+    if data[12:16] != b'\0\0\0\0': return False
+    if data[0xE0:0xEC] != b'\0' * 12: return False
+    if data[FOOTER_OFFSET:COURSE_SIZE] != b'\0' * (COURSE_SIZE - FOOTER_OFFSET): return False
+
+    return True
+
+
+def validate(data):
+    """
+    Checks course data more thoroughly than isValidCourseData(), and
+    returns a list of the problems found (an empty list if it's fine)
+    """
+    if len(data) != COURSE_SIZE:
+        return ['The course data is 0x%X bytes long instead of 0x%X' % (len(data), COURSE_SIZE)]
+
+    problems = []
+
+    version = struct.unpack_from('>Q', data, 0)[0]
+    if version != COURSE_VERSION:
+        problems.append('The version is 0x%X instead of 0x%X' % (version, COURSE_VERSION))
+
+    for start, end in [(12, 16), (0xE0, 0xEC), (FOOTER_OFFSET, COURSE_SIZE)]:
+        if data[start:end] != b'\0' * (end - start):
+            problems.append('The padding at 0x%X-0x%X is not empty' % (start, end))
+
+    header = headerStruct.unpack_from(data, 0)
+    if header[1] != courseHash(data):
+        problems.append('The hash is 0x%08X, but should be 0x%08X' % (header[1], courseHash(data)))
+    if header[12] not in STYLES:
+        problems.append('Unknown style %r' % header[12])
+    if header[14] >= 6:
+        problems.append('Unknown theme %d' % header[14])
+
+    numItems = header[24]
+    if numItems > MAX_SPRITES:
+        problems.append('There are %d sprites, but only room for %d' % (numItems, MAX_SPRITES))
+        numItems = MAX_SPRITES
+
+    for i in range(numItems):
+        sprinfo = spriteStruct.unpack_from(data, SPRITES_OFFSET + SPRITE_SIZE * i)
+        if not (sprinfo[11] == -1 or 0 <= sprinfo[11] < NUM_EFFECTS):
+            problems.append('Sprite %d uses effect %d, which is out of range' % (i, sprinfo[11]))
+
+    # Finally, make sure everything can actually be loaded
+    if not problems:
+        try:
+            Course().load(data)
+        except Exception as e:
+            problems.append('The course could not be loaded: %s' % (str(e) or type(e).__name__))
+
+    return problems
+
+
+def unpackCourseFiles(data, decompress=yaz0.decompress_opt, sort=True):
+    """
+    Returns a list of (name, data) for each .cdt file in a course file,
+    decompressing it and/or looking inside it if it's a SARC archive.
+    For a plain .cdt, the name is None. The files are sorted by name,
+    unless sort is False, in which case they're in archive order.
+
+    yaz0.decompress_opt() works through temporary files in yaz0kit/, so
+    pass decompress=yaz0.decompress if several processes might be
+    doing this at once.
+    """
+
+    # Decompress the level if needed
+    if data[:4] == b'Yaz0':
+        data = decompress(data)
+
+    if data[:4] != b'SARC':
+        return [(None, data)]
+
+    # Un-archive the level
+    sarc = SarcLib.SARC_Archive()
+    sarc.load(data)
+
+    files = []
+    def addFolder(contents, path):
+        for item in contents:
+            if isinstance(item, SarcLib.Folder):
+                addFolder(item.contents, path + item.name + '/')
+            elif item.name.endswith('.cdt'):
+                files.append((path + item.name, item.data))
+    addFolder(sarc.contents, '')
+
+    if sort:
+        files.sort(key=lambda file: file[0])
+    return files
+
+
+def extractCourseData(data):
+    """
+    Returns the course data from a course file, decompressing it and/or
+    taking it out of a SARC archive if needed. Returns None if no
+    course data can be found.
+    """
+
+    # This is a bad method that just grabs the first
+    # .cdt it finds, but... we don't necessarily know
+    # the filename to look for, so it would be hard
+    # to do much better than this.
+    for name, courseData in unpackCourseFiles(data, sort=False):
+        if isValidCourseData(courseData):
+            return courseData
+
+    return None
+
+
+def load(data):
+    """
+    Returns a Course loaded from a course file's data
+    """
+    courseData = extractCourseData(data)
+    if courseData is None:
+        raise ValueError("This doesn't seem to be a valid course.")
+
+    course = Course()
+    course.load(courseData)
+    return course
+
+
+def save(course):
+    """
+    Returns a Course as .cdt data
+    """
+    return course.save()
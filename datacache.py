@@ -0,0 +1,147 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Metamaker - A low-level Super Mario Maker course editor
+# Version 0.1.0
+# Copyright (C) 2009-2019 Treeki, Tempus, angelsl, JasonP27, Kamek64,
+# MalStar1000, RoadrunnerWMC, AboodXD
+
+# This file is part of Metamaker.
+
+# Metamaker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Metamaker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Metamaker.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+# datacache.py
+# Saves the result of parsing a set of data files to disk, so it can be
+# loaded in one read next time unless one of the files changed
+
+
+################################################################
+################################################################
+
+# Imports
+
+import hashlib
+import os
+import pickle
+
+
+# Bump this whenever the format of the cache file itself changes
+CACHE_VERSION = 1
+
+
+class DataCache():
+    """
+    A pickled blob of data compiled from some source files, which is
+    thrown away as soon as any of the source files change
+    """
+    def __init__(self, cachePath, sources, version):
+        """
+        Initializes the cache. version should be changed whenever the
+        compiled data's format changes.
+        """
+        self.cachePath = cachePath
+        self.sources = list(sources)
+        self.version = version
+
+
+    @staticmethod
+    def fileKey(path):
+        """
+        Returns (size, mtime, hash) for a file
+        """
+        st = os.stat(path)
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        return st.st_size, st.st_mtime_ns, digest
+
+
+    def sourcesUnchanged(self, keys):
+        """
+        Returns True if the saved source keys still match the files. The
+        hash is only checked for files whose size or mtime changed, and
+        keys is updated in-place with the new mtimes if it matches.
+        """
+        if [path for path, key in keys] != self.sources:
+            return False
+
+        for i, (path, (size, mtime, digest)) in enumerate(keys):
+            st = os.stat(path)
+            if st.st_size == size and st.st_mtime_ns == mtime: continue
+
+            newKey = self.fileKey(path)
+            if newKey[2] != digest: return False
+            keys[i] = (path, newKey)
+
+        return True
+
+
+    def load(self):
+        """
+        Returns the compiled data, or None if the cache is missing,
+        unreadable or out of date
+        """
+        try:
+            with open(self.cachePath, 'rb') as f:
+                saved = pickle.load(f)
+        except Exception:
+            return None
+
+        if not isinstance(saved, dict): return None
+        if saved.get('cacheVersion') != CACHE_VERSION: return None
+        if saved.get('version') != self.version: return None
+
+        keys = saved['sources']
+        oldKeys = list(keys)
+        try:
+            if not self.sourcesUnchanged(keys): return None
+        except OSError:
+            return None
+
+        # Files that were touched without being changed get their new
+        # mtimes saved, so they don't have to be hashed every time
+        if keys != oldKeys:
+            self.write(keys, saved['data'])
+
+        return saved['data']
+
+
+    def save(self, data):
+        """
+        Saves newly compiled data, keyed to the current source files
+        """
+        self.write([(path, self.fileKey(path)) for path in self.sources], data)
+
+
+    def write(self, keys, data):
+        """
+        Writes the cache file. Failing to write it isn't an error; it'll
+        just be recompiled next time.
+        """
+        saved = {
+            'cacheVersion': CACHE_VERSION,
+            'version': self.version,
+            'sources': keys,
+            'data': data,
+            }
+
+        try:
+            os.makedirs(os.path.dirname(self.cachePath), exist_ok=True)
+            tempPath = self.cachePath + '.tmp'
+            with open(tempPath, 'wb') as f:
+                pickle.dump(saved, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tempPath, self.cachePath)
+        except OSError as e:
+            print('Could not save %s: %s' % (self.cachePath, e))
@@ -7,6 +7,12 @@
 ################################################################
 ################################################################
 
+import sys
+from array import array
+
+
+# Lookup tables built by getConversionTable, keyed by (format_, bpp, compSel)
+conversionTables = {}
 
 def getComponentsFromPixel(format_, pixel, comp):
     if format_ == 'l8':
@@ -57,17 +63,159 @@ def getComponentsFromPixel(format_, pixel, comp):
     return comp
 
 
-def torgba8(width, height, data, format_, bpp, compSel):
+def getConversionTable(format_, bpp, compSel):
+    """
+    Returns a list mapping every possible 8/16-bit pixel value to its
+    final RGBA8 bytes, with compSel already applied
+    """
+    compSel = tuple(compSel[:4])
+    key = (format_, bpp, compSel)
+
+    if key not in conversionTables:
+        comp = bytearray([0, 0, 0, 0xFF, 0, 0xFF])
+        table = []
+
+        for pixel in range(1 << (8 * bpp)):
+            comp = getComponentsFromPixel(format_, pixel, comp)
+            table.append(bytes(comp[sel] for sel in compSel))
+
+        conversionTables[key] = table
+
+    return conversionTables[key]
+
+
+def getComponentPlanes(data, numPixels):
+    """
+    Splits bgr10a2 pixels into the six planes that compSel can select
+    from: R, G, B, A, zero and 0xFF
+    """
+    pixels = array('I', data[:numPixels * 4])
+    if sys.byteorder == 'big':
+        pixels.byteswap()
+
+    ten = bytes(int(i / 0x3FF * 0xFF) for i in range(0x400))
+    two = bytes(int(i / 0x3 * 0xFF) for i in range(4))
+
+    return [
+        bytes(ten[pixel & 0x3FF] for pixel in pixels),
+        bytes(ten[(pixel >> 10) & 0x3FF] for pixel in pixels),
+        bytes(ten[(pixel >> 20) & 0x3FF] for pixel in pixels),
+        bytes(two[pixel >> 30] for pixel in pixels),
+        bytes(numPixels),
+        b'\xFF' * numPixels,
+    ]
+
+
+def getOutputBuffer(size, out):
+    """
+    Returns the buffer a conversion should write its RGBA8 data to:
+    the caller's writable buffer (e.g. a QImage's bits()) if given,
+    otherwise a new bytearray
+    """
+    if out is None:
+        return bytearray(size)
+
+    assert len(out) >= size
+    return out
+
+
+def expandChannels(data, numPixels, numChannels, compSel, out=None):
+    """
+    Expands pixels of 1 to 4 byte-sized channels into RGBA8 with one
+    strided copy per output channel. Selectors past the source channels
+    give 0, or 0xFF for alpha (3) and 5, like getComponentsFromPixel
+    """
+    size = numPixels * numChannels
+    new_data = getOutputBuffer(numPixels * 4, out)
+
+    for i in range(4):
+        if compSel[i] < numChannels:
+            new_data[i:numPixels * 4:4] = data[compSel[i]:size:numChannels]
+
+        elif compSel[i] in [3, 5]:
+            new_data[i:numPixels * 4:4] = b'\xFF' * numPixels
+
+        else:
+            new_data[i:numPixels * 4:4] = bytes(numPixels)
+
+    return out if out is not None else bytes(new_data)
+
+
+def applyCompSel(width, height, data, compSel, out=None):
+    """
+    Applies compSel to RGBA8 data. The identity selector returns the
+    data untouched
+    """
+    size = width * height * 4
+    assert len(data) >= size
+
+    if tuple(compSel[:4]) == (0, 1, 2, 3):
+        if out is None:
+            return bytes(data[:size])
+
+        out[:size] = data[:size]
+        return out
+
+    return expandChannels(data, width * height, 4, compSel, out)
+
+
+def torgba8(width, height, data, format_, bpp, compSel, out=None):
+    """
+    Converts the data to RGBA8 and applies compSel. If out is given,
+    the result is written into it instead of a new bytes object
+    """
     assert len(data) >= width * height * bpp
 
+    numPixels = width * height
+    size = numPixels * 4
+
+    if bpp not in [1, 2, 4]:
+        new_data = bytes(size)
+
+    elif bpp == 4:
+        if format_ == 'rgba8':
+            return applyCompSel(width, height, data, compSel, out)
+
+        elif format_ == 'bgr10a2':
+            planes = getComponentPlanes(data, numPixels)
+
+            new_data = getOutputBuffer(size, out)
+            for i in range(4):
+                new_data[i:size:4] = planes[compSel[i]]
+
+            return out if out is not None else bytes(new_data)
+
+        new_data = torgba8Slow(width, height, data, format_, bpp, compSel)
+
+    elif (format_, bpp) in [('l8', 1), ('la8', 2)]:
+        return expandChannels(data, numPixels, bpp, compSel, out)
+
+    else:
+        table = getConversionTable(format_, bpp, compSel)
+
+        if bpp == 1:
+            pixels = data[:numPixels]
+
+        else:
+            pixels = array('H', data[:numPixels * 2])
+            if sys.byteorder == 'big':
+                pixels.byteswap()
+
+        new_data = b''.join(map(table.__getitem__, pixels))
+
+    if out is None:
+        return new_data
+
+    out[:size] = new_data
+    return out
+
+
+def torgba8Slow(width, height, data, format_, bpp, compSel):
     size = width * height * 4
     new_data = bytearray(size)
 
     comp = bytearray([0, 0, 0, 0xFF, 0, 0xFF])
 
-    if bpp not in [1, 2, 4]:
-        return bytes(new_data)
-
     for y in range(height):
         for x in range(width):
             pos = (y * width + x) * bpp
@@ -88,13 +236,4 @@ def torgba8(width, height, data, format_, bpp, compSel):
 
 
 def rgb8torgbx8(data):
-    numPixels = len(data) // 3
-    new_data = bytearray(numPixels * 4)
-
-    for i in range(numPixels):
-        new_data[4 * i + 0] = data[3 * i + 0]
-        new_data[4 * i + 1] = data[3 * i + 1]
-        new_data[4 * i + 2] = data[3 * i + 2]
-        new_data[4 * i + 3] = 0xFF
-
-    return bytes(new_data)
+    return expandChannels(data, len(data) // 3, 3, (0, 1, 2, 5))
@@ -10,6 +10,7 @@
 from cpython cimport array
 from cython cimport view
 from libc.stdlib cimport malloc, free
+from libc.string cimport memcpy, memset
 
 
 ctypedef unsigned char u8
@@ -65,7 +66,28 @@ cdef u8 *getComponentsFromPixel(str format_, pixel, u8 *comp):
 
     return comp
 
-cpdef bytes torgba8(u32 width, u32 height, bytearray data_, str format_, u32 bpp, list compSel_):
+cdef object returnData(u8 *new_data, u32 size, out):
+    """
+    Returns the converted data as bytes, or copies it into out
+    (e.g. a QImage's bits()) if that is given
+    """
+    cdef u8[::1] outView
+
+    if out is None:
+        return bytes(<u8[:size]>new_data)
+
+    outView = out
+    assert outView.shape[0] >= size
+
+    memcpy(&outView[0], new_data, size)
+    return out
+
+
+cpdef torgba8(u32 width, u32 height, data_, str format_, u32 bpp, list compSel_, out=None):
+    """
+    Converts the data to RGBA8 and applies compSel. If out is given,
+    the result is written into it instead of a new bytes object
+    """
     cdef:
         array.array dataArr = array.array('B', data_)
         u8 *data = dataArr.data.as_uchars
@@ -78,6 +100,9 @@ cpdef bytes torgba8(u32 width, u32 height, bytearray data_, str format_, u32 bpp
 
     assert len(data_) >= width * height * bpp
 
+    if (format_, bpp) in [('l8', 1), ('la8', 2)]:
+        return expandChannels(data_, width * height, bpp, compSel_, out)
+
     cdef:
         u32 size = width * height * 4
         u8 *new_data = <u8 *>malloc(size)
@@ -93,8 +118,10 @@ cpdef bytes torgba8(u32 width, u32 height, bytearray data_, str format_, u32 bpp
     comp[5] = 0xFF
 
     if bpp not in [1, 2, 4]:
+        memset(new_data, 0, size)
+
         try:
-            return bytes(<u8[:size]>new_data)
+            return returnData(new_data, size, out)
 
         finally:
             free(new_data)
@@ -117,13 +144,60 @@ cpdef bytes torgba8(u32 width, u32 height, bytearray data_, str format_, u32 bpp
             new_data[pos_ + 0] = <u8>comp[compSel[0]]
 
     try:
-        return bytes(<u8[:size]>new_data)
+        return returnData(new_data, size, out)
 
     finally:
         free(new_data)
         free(comp)
 
 
+cpdef expandChannels(data, u32 numPixels, u32 numChannels, compSel, out=None):
+    """
+    Expands pixels of 1 to 4 byte-sized channels into RGBA8 with one
+    strided copy per output channel. Selectors past the source channels
+    give 0, or 0xFF for alpha (3) and 5, like getComponentsFromPixel
+    """
+    cdef:
+        u32 size = numPixels * numChannels
+        u32 i
+
+        # Typed as a generic object so slice assignment accepts bytes
+        object new_data = bytearray(numPixels * 4) if out is None else out
+
+    assert len(new_data) >= numPixels * 4
+
+    for i in range(4):
+        if compSel[i] < numChannels:
+            new_data[i:numPixels * 4:4] = data[compSel[i]:size:numChannels]
+
+        elif compSel[i] in [3, 5]:
+            new_data[i:numPixels * 4:4] = b'\xFF' * numPixels
+
+        else:
+            new_data[i:numPixels * 4:4] = bytes(numPixels)
+
+    return out if out is not None else bytes(new_data)
+
+
+cpdef applyCompSel(u32 width, u32 height, data, list compSel, out=None):
+    """
+    Applies compSel to RGBA8 data. The identity selector returns the
+    data untouched
+    """
+    cdef u32 size = width * height * 4
+
+    assert len(data) >= size
+
+    if compSel[:4] == [0, 1, 2, 3]:
+        if out is None:
+            return bytes(data[:size])
+
+        out[:size] = data[:size]
+        return out
+
+    return expandChannels(data, width * height, 4, compSel, out)
+
+
 cpdef bytes rgb8torgbx8(bytearray data):
     cdef:
         u32 numPixels = len(data) // 3
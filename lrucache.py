@@ -0,0 +1,152 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Metamaker - A low-level Super Mario Maker course editor
+# Version 0.1.0
+# Copyright (C) 2009-2019 Treeki, Tempus, angelsl, JasonP27, Kamek64,
+# MalStar1000, RoadrunnerWMC, AboodXD
+
+# This file is part of Metamaker.
+
+# Metamaker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Metamaker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Metamaker.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+# lrucache.py
+# A dict-like cache that evicts least-recently-used entries once the
+# total size of its values goes over a byte budget
+
+
+################################################################
+################################################################
+
+# Imports
+
+from collections import OrderedDict
+import threading
+
+
+class LRUCache():
+    """
+    Dict-like cache with a byte budget. sizeFunc(value) gives the size
+    of each entry; once the total goes over the budget, the least
+    recently used entries are dropped. Safe to use from several threads.
+    """
+    def __init__(self, budget, sizeFunc=len):
+        """
+        Initializes the cache with a budget in bytes
+        """
+        self.budget = budget
+        self.sizeFunc = sizeFunc
+        self.entries = OrderedDict() # key: (value, size)
+        self.totalSize = 0
+        self.lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def __contains__(self, key):
+        """
+        Checks for a key without counting as a use
+        """
+        return key in self.entries
+
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    def __getitem__(self, key):
+        """
+        Returns the value for key and marks it as recently used
+        """
+        with self.lock:
+            try:
+                value, _ = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                raise
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+    def __setitem__(self, key, value):
+        """
+        Adds or replaces an entry, then evicts old entries if needed
+        """
+        size = self.sizeFunc(value)
+
+        with self.lock:
+            if key in self.entries:
+                self.totalSize -= self.entries.pop(key)[1]
+
+            self.entries[key] = (value, size)
+            self.totalSize += size
+            self.evict()
+
+
+    def __delitem__(self, key):
+        with self.lock:
+            self.totalSize -= self.entries.pop(key)[1]
+
+
+    def evict(self):
+        """
+        Drops least recently used entries until the cache fits in its
+        budget again. The newest entry is always kept.
+        """
+        with self.lock:
+            while self.totalSize > self.budget and len(self.entries) > 1:
+                _, (_, size) = self.entries.popitem(last=False)
+                self.totalSize -= size
+                self.evictions += 1
+
+
+    def setBudget(self, budget):
+        """
+        Changes the byte budget, evicting entries if it shrank
+        """
+        self.budget = budget
+        self.evict()
+
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.totalSize = 0
+
+
+    def stats(self):
+        """
+        Returns a dict of the cache's counters, for debugging
+        """
+        return {
+            'entries': len(self.entries),
+            'size': self.totalSize,
+            'budget': self.budget,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            }
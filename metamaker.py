@@ -42,13 +42,14 @@ if currentRunningVersion < MIN_PY_VER:
 
 # Stdlib imports
 import base64
-import binascii
-from math import floor as math_floor
+from concurrent.futures import ThreadPoolExecutor, wait as waitForFutures
+import hashlib
+from math import ceil as math_ceil, floor as math_floor, log2 as math_log2
 import os.path
-import struct
 import subprocess
 import threading
 import time
+import traceback
 import urllib.request
 from xml.etree import ElementTree as etree
 import zipfile
@@ -57,13 +58,20 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 Qt = QtCore.Qt
 
 # Local imports
+from assetindex import AssetIndex
+from autosave import AutoSaver
 import bfres as BFRES
+import course as CourseLib
+from datacache import DataCache
 from i18n import _
+from lrucache import LRUCache
 HAS_MIDO = True
 try:
     import midi2sprites
 except ImportError:
     HAS_MIDO = False
+from pngwriter import PNGWriter
+import resources
 import sarc as SarcLib
 import spritelib as SLib
 import sprites
@@ -75,9 +83,9 @@ UPDATE_URL = ''
 
 TILE_WIDTH = 60
 
-DEFAULT_SPRITEDATA = b'\x06\0\x08@\0\0\0\0'
-DEFAULT_SUBSPRITEDATA = b'\x06\0\x08@'
-DEFAULT_EFFECT = b'\xFF\xFF\0\xFF\xFF\0\0\0'
+DEFAULT_SPRITEDATA = CourseLib.DEFAULT_SPRITEDATA
+DEFAULT_SUBSPRITEDATA = CourseLib.DEFAULT_SUBSPRITEDATA
+DEFAULT_EFFECT = CourseLib.DEFAULT_EFFECT
 
 # These are the min/max positions -- <i>not</i> the same as the scene boundaries!
 X_MIN = -1
@@ -189,7 +197,8 @@ def module_path():
         return os.path.dirname(sys.executable)
     if __name__ == '__main__':
         return os.path.dirname(os.path.abspath(sys.argv[0]))
-    return None
+    # Imported as a library (see rendercourses.py)
+    return os.path.dirname(os.path.abspath(__file__))
 
 compressed = False
 def checkContent(data):
@@ -224,14 +233,45 @@ def isValidCourseData(data):
     if data[:4] == b'Yaz0': return True
     elif data[:4] == b'SARC': return True
 
-    # Check some basic things and padding areas
-    if len(data) != 0x15000: return False
-    if data[:8] != b'\0\0\0\0\0\0\0\x0B': return False
-    if data[12:16] != b'\0\0\0\0': return False
-    if data[0xE0:0xEC] != b'\0' * 12: return False
-    if data[0x14F50:0x15000] != b'\0' * 0xB0: return False
+    return CourseLib.isValidCourseData(data)
 
-    return True
+
+AUTOSAVE_SLOTS = 16
+def AutoSaveLocation():
+    """
+    Picks the file this editor autosaves course data to, and locks it so
+    that editors open at the same time don't overwrite each other's
+    autosaves. A file left behind by an editor that isn't running anymore
+    is picked over an unused one, so that it can be restored. Returns
+    (path, lock); the QLockFile has to be kept for as long as the file is
+    used.
+    """
+    dataDir = os.path.join(QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.GenericDataLocation), 'Metamaker')
+    os.makedirs(dataDir, exist_ok=True)
+
+    unused = None
+    for i in range(AUTOSAVE_SLOTS):
+        path = os.path.join(dataDir, 'autosave.bin' if i == 0 else 'autosave%d.bin' % (i + 1))
+
+        # Editors hold their lock for as long as they're open, so it's
+        # only stale if the editor holding it isn't running anymore
+        lock = QtCore.QLockFile(path + '.lock')
+        lock.setStaleLockTime(0)
+        if not lock.tryLock(0): continue
+
+        if os.path.isfile(path):
+            if unused is not None: unused[1].unlock()
+            return path, lock
+
+        if unused is None:
+            unused = (path, lock)
+        else:
+            lock.unlock()
+
+    if unused is not None: return unused
+
+    # Lots of editors are open; use one file per process
+    return os.path.join(dataDir, 'autosave_%d.bin' % os.getpid()), None
 
 
 def FilesAreMissing():
@@ -354,22 +394,17 @@ class SpriteDefinition():
             return None
 
 
-    def loadFrom(self, elem):
+    @staticmethod
+    def compileFields(elem, fields):
         """
-        Loads in all the field data from an XML node
+        Reads the field data from an XML node into fields, as plain
+        tuples that can be saved in the sprite data cache
         """
-        self.fields = []
-        fields = self.fields
-
         for field in elem:
             if field.tag not in ['checkbox', 'list', 'value', 'bitfield']: continue
 
             attribs = field.attrib
-
-            if 'comment' in attribs:
-                comment = _('<b>{name}</b>: {note}', 'name', attribs['title'], 'note', attribs['comment'])
-            else:
-                comment = None
+            comment = attribs.get('comment')
 
             if field.tag == 'checkbox':
                 # parameters: title, nybble, mask, comment
@@ -382,7 +417,7 @@ class SpriteDefinition():
 
                 fields.append((0, attribs['title'], nybble, int(attribs['mask']) if 'mask' in attribs else 1, comment))
             elif field.tag == 'list':
-                # parameters: title, nybble, model, comment
+                # parameters: title, nybble, (entries, existing, max), comment
                 snybble = attribs['nybble']
                 if '-' not in snybble:
                     nybble = int(snybble) - 1
@@ -401,7 +436,7 @@ class SpriteDefinition():
                     entries.append((i, e.text))
                     existing[i] = True
 
-                fields.append((1, attribs['title'], nybble, SpriteDefinition.ListPropertyModel(entries, existing, max), comment))
+                fields.append((1, attribs['title'], nybble, (entries, existing, max), comment))
             elif field.tag == 'value':
                 # parameters: title, nybble, max, comment
                 snybble = attribs['nybble']
@@ -427,18 +462,48 @@ class SpriteDefinition():
                 fields.append((3, attribs['title'], startbit, bitnum, comment))
 
 
-def LoadSpriteData():
-    """
-    Ensures that the sprite data info is loaded
-    """
-    global Sprites
+    def setFields(self, compiled):
+        """
+        Sets up self.fields from compiled field data (see compileFields())
+        """
+        self.fields = []
+        for type, title, a, b, comment in compiled:
+            if comment is not None:
+                comment = _('<b>{name}</b>: {note}', 'name', title, 'note', comment)
 
-    Sprites = [None] * 70
-    errors = []
-    errortext = []
+            if type == 1:
+                b = SpriteDefinition.ListPropertyModel(*b)
+
+            self.fields.append((type, title, a, b, comment))
 
+
+    def loadFrom(self, elem):
+        """
+        Loads in all the field data from an XML node
+        """
+        compiled = []
+        try:
+            SpriteDefinition.compileFields(elem, compiled)
+        finally:
+            self.setFields(compiled)
+
+
+# Version number for the compiled sprite data; bump this whenever the
+# output of CompileSpriteData() changes
+SPRITE_DATA_VERSION = 1
+SPRITE_DATA_SOURCES = [
+    'metamakerdata/spritedata.xml',
+    'metamakerdata/spritenames.txt',
+    'metamakerdata/spritecategories.xml',
+    ]
+CompiledSpriteData = None
+
+def CompileSpriteNames(path):
+    """
+    Parses spritenames.txt into a list of names
+    """
     spritenames = []
-    with open('metamakerdata/spritenames.txt', 'r', encoding='utf-8') as f:
+    with open(path, 'r', encoding='utf-8') as f:
         for line in f:
             if line.startswith('#'): continue
 
@@ -462,63 +527,160 @@ def LoadSpriteData():
             L = L.replace(' \n', '\n')
             spritenames.append(L[:-1]) # cut off the \n
 
-    paths = [['metamakerdata/spritedata.xml', None]]
+    return spritenames
+
+
+def CompileSpriteData(datapath, namespath):
+    """
+    Parses spritedata.xml and spritenames.txt into a list of
+    (id, name, notes, fields) tuples, plus a list of (id, error) for
+    sprites that didn't parse correctly
+    """
+    spritenames = CompileSpriteNames(namespath)
+
+    sprites = []
+    errors = []
 
-    for sdpath, snpath in paths:
+    tree = etree.parse(datapath)
+    root = tree.getroot()
 
-        # Add XML sprite data, if there is any
-        if sdpath not in (None, ''):
-            path = sdpath if isinstance(sdpath, str) else sdpath.path
-            tree = etree.parse(path)
-            root = tree.getroot()
+    for sprite in root:
+        if sprite.tag.lower() != 'sprite': continue
 
-            for sprite in root:
-                if sprite.tag.lower() != 'sprite': continue
+        try: spriteid = int(sprite.attrib['id'])
+        except ValueError: continue
+        spritename = spritenames[spriteid] # formerly sprite.attrib['name']
+        notes = sprite.attrib.get('notes')
 
-                try: spriteid = int(sprite.attrib['id'])
-                except ValueError: continue
-                spritename = spritenames[spriteid] # formerly sprite.attrib['name']
-                notes = None
+        fields = []
+        try:
+            SpriteDefinition.compileFields(sprite, fields)
+        except Exception as e:
+            errors.append((spriteid, str(e)))
 
-                if 'notes' in sprite.attrib:
-                    notes = _('<b>Sprite Notes:</b> {notes}', 'notes', sprite.attrib['notes'])
+        sprites.append((spriteid, spritename, notes, fields))
 
-                sdef = SpriteDefinition()
-                sdef.id = spriteid
-                sdef.name = spritename
-                sdef.notes = notes
+    return sprites, errors
 
-                try:
-                    sdef.loadFrom(sprite)
-                except Exception as e:
-                    errors.append(str(spriteid))
-                    errortext.append(str(e))
-
-                Sprites[spriteid] = sdef
-
-        # Add TXT sprite names, if there are any
-        # This code is only ever run when a custom
-        # gamedef is loaded, because spritenames.txt
-        # is a file only ever used by custom gamedefs.
-        if (snpath is not None) and (snpath.path is not None):
-            snfile = open(snpath.path)
-            data = snfile.read()
-            snfile.close()
-            del snfile
-
-            # Split the data
-            data = data.split('\n')
-            for i, line in enumerate(data): data[i] = line.split(':')
-
-            # Apply it
-            for spriteid, name in data:
-                Sprites[int(spriteid)].name = name
+
+def CompileSpriteCategories(path):
+    """
+    Parses spritecategories.xml into a list of
+    (viewname, [(catname, [sprite ids]), ...]) tuples
+    """
+    categories = []
+
+    tree = etree.parse(path)
+    root = tree.getroot()
+
+    CurrentView = None
+    for view in root:
+        if view.tag.lower() != 'view': continue
+
+        viewname = view.attrib['name']
+
+        # See if it's in there already
+        CurrentView = []
+        for potentialview in categories:
+            if potentialview[0] == viewname: CurrentView = potentialview[1]
+        if CurrentView == []: categories.append((viewname, CurrentView))
+
+        CurrentCategory = None
+        for category in view:
+            if category.tag.lower() != 'category': continue
+
+            catname = category.attrib['name']
+
+            # See if it's in there already
+            CurrentCategory = []
+            for potentialcat in CurrentView:
+                if potentialcat[0] == catname: CurrentCategory = potentialcat[1]
+            if CurrentCategory == []: CurrentView.append((catname, CurrentCategory))
+
+            for attach in category:
+                if attach.tag.lower() != 'attach': continue
+
+                sprite = attach.attrib['sprite']
+                if '-' not in sprite:
+                    if int(sprite) not in CurrentCategory:
+                        CurrentCategory.append(int(sprite))
+                else:
+                    x = sprite.split('-')
+                    for i in range(int(x[0]), int(x[1])+1):
+                        if i not in CurrentCategory:
+                            CurrentCategory.append(i)
+
+    return categories
+
+
+def SpriteDataCachePath():
+    """
+    Returns the path the compiled sprite data is cached at
+    """
+    cacheDir = QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.GenericCacheLocation)
+    return os.path.join(cacheDir, 'Metamaker', 'spritedata.cache')
+
+
+def LoadCompiledSpriteData(reload_=False):
+    """
+    Returns the compiled sprite definitions, names and categories,
+    reading them from the cache if the source files haven't changed
+    since it was saved
+    """
+    global CompiledSpriteData
+    if (CompiledSpriteData is not None) and not reload_: return CompiledSpriteData
+
+    cache = DataCache(SpriteDataCachePath(), SPRITE_DATA_SOURCES, SPRITE_DATA_VERSION)
+    data = cache.load()
+
+    if data is None:
+        datapath, namespath, categoriespath = SPRITE_DATA_SOURCES
+        sprites, errors = CompileSpriteData(datapath, namespath)
+        data = {
+            'sprites': sprites,
+            'errors': errors,
+            'categories': CompileSpriteCategories(categoriespath),
+            }
+        cache.save(data)
+
+    CompiledSpriteData = data
+    return data
+
+
+def LoadSpriteData():
+    """
+    Ensures that the sprite data info is loaded
+    """
+    global Sprites
+
+    data = LoadCompiledSpriteData()
+
+    Sprites = [None] * 70
+    for spriteid, spritename, notes, fields in data['sprites']:
+        sdef = SpriteDefinition()
+        sdef.id = spriteid
+        sdef.name = spritename
+        sdef.notes = None
+        if notes is not None:
+            sdef.notes = _('<b>Sprite Notes:</b> {notes}', 'notes', notes)
+        sdef.setFields(fields)
+
+        Sprites[spriteid] = sdef
 
     # Warn the user if errors occurred
-    if len(errors) > 0:
+    if len(data['errors']) > 0:
+        errors = [str(spriteid) for spriteid, error in data['errors']]
+        errortext = [error for spriteid, error in data['errors']]
         QtWidgets.QMessageBox.warning(None, _('Warning'), _("The sprite data file didn't load correctly. The following sprites have incorrect and/or broken data in them, and may not be editable correctly in the editor: {sprites}", 'sprites', ', '.join(errors)), QtWidgets.QMessageBox.Ok)
         QtWidgets.QMessageBox.warning(None, _('Errors'), repr(errortext))
 
+def LoadSpriteDataResource():
+    """
+    Loads the sprite data info and returns it, for resources.get()
+    """
+    LoadSpriteData()
+    return Sprites
+
 SpriteCategories = None
 def LoadSpriteCategories(reload_=False):
     """
@@ -526,50 +688,13 @@ def LoadSpriteCategories(reload_=False):
     """
     global Sprites, SpriteCategories
     if (SpriteCategories is not None) and not reload_: return
+    resources.get('Sprite data')
 
-    paths = ['metamakerdata/spritecategories.xml']
-
+    # The node lists are filled in by the sprite pickers, so every
+    # list here has to be a new copy of the compiled one
     SpriteCategories = []
-    for path in paths:
-        tree = etree.parse(path)
-        root = tree.getroot()
-
-        CurrentView = None
-        for view in root:
-            if view.tag.lower() != 'view': continue
-
-            viewname = view.attrib['name']
-
-            # See if it's in there already
-            CurrentView = []
-            for potentialview in SpriteCategories:
-                if potentialview[0] == viewname: CurrentView = potentialview[1]
-            if CurrentView == []: SpriteCategories.append((viewname, CurrentView, []))
-
-            CurrentCategory = None
-            for category in view:
-                if category.tag.lower() != 'category': continue
-
-                catname = category.attrib['name']
-
-                # See if it's in there already
-                CurrentCategory = []
-                for potentialcat in CurrentView:
-                    if potentialcat[0] == catname: CurrentCategory = potentialcat[1]
-                if CurrentCategory == []: CurrentView.append((catname, CurrentCategory))
-
-                for attach in category:
-                    if attach.tag.lower() != 'attach': continue
-
-                    sprite = attach.attrib['sprite']
-                    if '-' not in sprite:
-                        if int(sprite) not in CurrentCategory:
-                            CurrentCategory.append(int(sprite))
-                    else:
-                        x = sprite.split('-')
-                        for i in range(int(x[0]), int(x[1])+1):
-                            if i not in CurrentCategory:
-                                CurrentCategory.append(i)
+    for viewname, view in LoadCompiledSpriteData()['categories']:
+        SpriteCategories.append((viewname, [(catname, list(category)) for catname, category in view], []))
 
     # Add a Search category
     SpriteCategories.append((_('Search'), [(_('Search Results'), list(range(70)))], []))
@@ -685,6 +810,7 @@ def SetAppStyle():
     app.setStyle(style)
 
 
+Assets = None
 Course = None
 Dirty = False
 DirtyOverride = 0
@@ -716,7 +842,7 @@ def LoadNumberFont():
     Creates a valid font we can use to display the item numbers
     """
     global NumberFont
-    if NumberFont is not None: return
+    if NumberFont is not None: return NumberFont
 
     # this is a really crappy method, but I can't think of any other way
     # normal Qt defines Q_WS_WIN and Q_WS_MAC but we don't have that here
@@ -728,6 +854,8 @@ def LoadNumberFont():
     else:
         NumberFont = QtGui.QFont('Sans', (8/24) * TILE_WIDTH)
 
+    return NumberFont
+
 def SetDirty(noautosave=False):
     global Dirty, DirtyOverride, AutoSaveDirty
     if DirtyOverride > 0: return
@@ -743,23 +871,88 @@ def SetDirty(noautosave=False):
 
 
 
-class AssetsClass:
+def ftexSize(tex):
+    """
+    Returns the number of bytes of texture data held by an FTEX
+    """
+    return len(tex.data) + len(tex.mipData)
+
+
+def imageSize(img):
+    """
+    Returns the number of bytes used by a QImage (or None)
+    """
+    return 0 if img is None else img.byteCount()
+
+
+
+class AssetsClass(QtCore.QObject):
     """
     An object that lets you access any assets from the SMM Model folder.
     Provides readable syntax and very nice caching optimizations!
     """
-    def __init__(self, modelpath, packpath):
+    textureLoaded = QtCore.pyqtSignal(str)
+
+    # Number of worker threads used by getAsync()
+    DecodeThreads = 4
+    # Seconds without any getAsync() loads before the texture scan
+    # moves on to its next file
+    ScanIdleTime = 3
+
+    def __init__(self, modelpath, packpath, threadSafe=False, scan=True):
         """
-        Initializes Assets
+        Initializes Assets. threadSafe decompresses model files in memory
+        instead of through yaz0kit's temp files, which other processes
+        running from the same folder would share. scan indexes the
+        textures in the Model folder in the background.
         """
+        super().__init__()
+
         self.modelpath = modelpath
         self.packpath = packpath
+        self.threadSafe = threadSafe
+
+        # Only files that changed since the last run need restatting here;
+        # the textures inside new files are indexed by scanModelTextures()
+        self.modelIndex = AssetIndex(modelpath, self.indexPath(modelpath))
+        self.packIndex = AssetIndex(packpath, self.indexPath(packpath))
+        self.modelIndex.refresh()
+        self.packIndex.refresh()
+
         self.pathsverified = self.verifyPaths()
 
         self.loadedModels = set()
         self.loadedPacks = set()
-        self.ftexCacheRaw = {}
-        self.ftexCacheRendered = {}
+
+        # Both caches are limited to a budget (in MB) and drop the least
+        # recently used textures when they outgrow it
+        self.ftexCacheRaw = LRUCache(int(setting('RawTextureCacheMB', 128)) * 0x100000, ftexSize)
+        self.ftexCacheRendered = LRUCache(int(setting('TextureCacheMB', 128)) * 0x100000, imageSize)
+
+        # Model files share yaz0kit's temp files, so load one at a time
+        self.modelLock = threading.Lock()
+
+        # Keys currently being loaded by getAsync(), and their futures
+        self.pendingLoads = {}
+        self.pendingLock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=self.DecodeThreads)
+        self.lastLoadTime = time.monotonic()
+
+        # Keys getAsync() returned None for; see waitForTextures()
+        self.misses = set()
+
+        if scan:
+            threading.Thread(target=self.scanModelTextures, daemon=True).start()
+
+
+    @staticmethod
+    def indexPath(folder):
+        """
+        Returns the path the index of a Model/ or Pack/ folder is saved to
+        """
+        cacheDir = QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.GenericCacheLocation)
+        folderHash = hashlib.md5(os.path.abspath(folder or '').encode('utf-8')).hexdigest()
+        return os.path.join(cacheDir, 'Metamaker', 'index_%s.json' % folderHash)
 
 
     def verifyPaths(self):
@@ -768,9 +961,13 @@ class AssetsClass:
         proper SMM Model/ and Pack/ folders, respectively.
         """
 
-        # TODO: check the Model/ and Pack/ folders for the existence of a few select files
+        # Every style and theme has a tileset in the Model/ folder
+        for style in range(4):
+            for theme in range(6):
+                if SLib.TilesetName(style, theme).split('/')[1] not in self.modelIndex:
+                    return False
 
-        return True
+        return bool(self.packpath) and os.path.isdir(self.packpath)
 
 
     def __getitem__(self, key):
@@ -788,9 +985,12 @@ class AssetsClass:
         """
         print('AssetsClass[\'' + key + '\']')
         # Quick short-circuit
-        if key in self.ftexCacheRendered:
+        try:
+            img = self.ftexCacheRendered[key]
             print('    Short-circuiting.')
-            return self.ftexCacheRendered[key]
+            return img
+        except KeyError:
+            pass
 
         if key.startswith('Model/'):
             print('    Loading a model/ .')
@@ -800,7 +1000,11 @@ class AssetsClass:
             # Make sure the SZS/SARC/BFRES is loaded
             bfresName = key.split('/')[1]
             print('    ... called %s' % bfresName)
-            self.loadModelItemIntoCache(bfresName)
+            with self.modelLock:
+                # Reload the model if its raw textures were evicted
+                if key not in self.ftexCacheRaw:
+                    self.loadedModels.discard(bfresName)
+                self.loadModelItemIntoCache(bfresName)
 
         elif key.startswith('Pack/'):
             print('    Loading a pack/ .')
@@ -810,7 +1014,10 @@ class AssetsClass:
             # Make sure the Pack file is loaded
             packName = key.split('/')[1]
             print('    ... called %s' % packName)
-            self.loadPackIntoCache(packName)
+            with self.modelLock:
+                if key not in self.ftexCacheRaw:
+                    self.loadedPacks.discard(packName)
+                self.loadPackIntoCache(packName)
 
         else:
             raise ValueError('Invalid key format.')
@@ -831,6 +1038,72 @@ class AssetsClass:
             return None if img.isNull() else img
 
 
+    def getAsync(self, key, prefetch=False):
+        """
+        Like self[key], but never blocks the GUI thread. If the texture
+        isn't ready yet, it's loaded on a worker thread and None is
+        returned for now; textureLoaded(key) is emitted once it's done.
+        Requests for a key that's already loading share that load.
+        Unless prefetch is True, the miss is remembered for
+        waitForTextures().
+        """
+        try:
+            img = self.ftexCacheRendered[key]
+            return None if img is None or img.isNull() else img
+        except KeyError:
+            pass
+
+        with self.pendingLock:
+            if not prefetch:
+                self.misses.add(key)
+            if key not in self.pendingLoads:
+                self.pendingLoads[key] = self.executor.submit(self.loadInBackground, key)
+
+        return None
+
+
+    def clearMisses(self):
+        """
+        Forgets the textures getAsync() couldn't return so far
+        """
+        with self.pendingLock:
+            self.misses = set()
+
+
+    def waitForTextures(self, timeout=None):
+        """
+        Blocks until every texture getAsync() couldn't return since the
+        last call (or clearMisses()) has finished loading. Prefetches
+        aren't waited for. Returns False if there weren't any.
+        """
+        with self.pendingLock:
+            keys, self.misses = self.misses, set()
+            futures = [self.pendingLoads[key] for key in keys if key in self.pendingLoads]
+        if not keys: return False
+
+        waitForFutures(futures, timeout)
+        return True
+
+
+    def loadInBackground(self, key):
+        """
+        Loads a texture for getAsync(), on a worker thread
+        """
+        try:
+            self[key]
+        except Exception:
+            # Remember the failure so it isn't retried on every repaint
+            traceback.print_exc()
+            self.ftexCacheRendered[key] = None
+        finally:
+            with self.pendingLock:
+                del self.pendingLoads[key]
+                self.lastLoadTime = time.monotonic()
+
+        # Queued over to the GUI thread by Qt
+        self.textureLoaded.emit(key)
+
+
     def loadModelItemIntoCache(self, modelName):
         """
         Load something from the Model folder ([Yaz0 -> ] SARC -> BFRES)
@@ -842,20 +1115,38 @@ class AssetsClass:
         self.loadedModels.add(modelName)
         print('        Added that to self.loadedModels')
 
+        bfresData = self.readModelFile(modelName, self.threadSafe)
+
+        # Load it
+        print('        Loading that bfres into the cache, prefixed with "Model/' + modelName + '"...')
+        names = self.loadBfresIntoCache('Model/' + modelName, bfresData)
+        self.modelIndex.setTextures(modelName, names)
+
+
+    def readModelFile(self, modelName, threadSafe=False):
+        """
+        Returns the BFRES data of something from the Model folder
+        ([Yaz0 -> ] SARC -> BFRES). Unless threadSafe is True, this uses
+        yaz0kit's temp files, so it must be called with self.modelLock held.
+        """
         # Find the file to open, and if it's compressed or not
-        fp = os.path.join(self.modelpath, modelName + '.sarc')
-        print('        Trying "' + fp + '"')
-        compressed = False
-        if not os.path.isfile(fp):
-            fp = os.path.join(self.modelpath, modelName + '.szs')
-            print('        Didn\'t exist; assuming "' + fp + '"...')
-            compressed = True
+        location = self.modelIndex.path(modelName)
+        if location is None:
+            # Maybe it was added since the folder was indexed
+            self.modelIndex.refresh()
+            location = self.modelIndex.path(modelName)
+        if location is None:
+            raise FileNotFoundError(os.path.join(self.modelpath, modelName + '.szs'))
+        fp, compressed = location
 
         # Get the data
-        print('        Opening that.')
+        print('        Opening "' + fp + '"')
         if not compressed:
             with open(fp, 'rb') as f:
                 sarcData = f.read()
+        elif threadSafe:
+            with open(fp, 'rb') as f:
+                sarcData = yaz0.decompress(f.read())
         else:
             sarcData = yaz0.decompress_opt(fp)
         print('        Got a sarc?: ' + repr(sarcData[:8]))
@@ -868,10 +1159,59 @@ class AssetsClass:
         bfresData = sarcFile.data
 
         print('        Got a BFRES?: ' + repr(bfresData[:8]))
+        return bfresData
 
-        # Load it
-        print('        Loading that bfres into the cache, prefixed with "Model/' + modelName + '"...')
-        self.loadBfresIntoCache('Model/' + modelName, bfresData)
+
+    def scanModelTextures(self):
+        """
+        Records the texture names inside every Model file that hasn't
+        been indexed yet, then saves the indexes. Runs on its own thread.
+        """
+        for i, modelName in enumerate(self.modelIndex.unscanned()):
+            self.waitUntilIdle()
+
+            # Doesn't use modelLock, so it never holds up getAsync()
+            try:
+                bfresData = self.readModelFile(modelName, threadSafe=True)
+                names = [name for name, tex in BFRES.read(bfresData)]
+            except Exception:
+                # Don't retry broken files on every startup
+                traceback.print_exc()
+                names = []
+
+            self.modelIndex.setTextures(modelName, names)
+
+            # Save now and then, in case Metamaker is closed mid-scan
+            if i % 16 == 15:
+                self.modelIndex.save()
+
+        self.modelIndex.save()
+        self.packIndex.save()
+
+
+    def waitUntilIdle(self):
+        """
+        Blocks until no textures have been loaded by getAsync() for
+        ScanIdleTime seconds, so that the textures the course needs are
+        loaded before the rest of the Model folder is scanned
+        """
+        while True:
+            with self.pendingLock:
+                busy = bool(self.pendingLoads)
+                idleTime = time.monotonic() - self.lastLoadTime
+
+            if not busy and idleTime >= self.ScanIdleTime: return
+            time.sleep(0.25)
+
+
+    def findTexture(self, textureName):
+        """
+        Returns the key of the Model texture with this name, or None if
+        it isn't in the index (yet)
+        """
+        modelName = self.modelIndex.findTexture(textureName)
+        if modelName is None: return None
+        return 'Model/%s/%s' % (modelName, textureName)
 
 
     def loadPackItemIntoCache(self, packName):
@@ -895,6 +1235,7 @@ class AssetsClass:
             self.ftexCacheRaw[prefix + '/' + name] = tex
 
         print('            FTEX reading done.')
+        return [name for name, tex in textures]
 
 
     def loadFtex(self, key):
@@ -904,12 +1245,19 @@ class AssetsClass:
         """
         print('    loadFtex(\'' + key + '\')')
         # Return the rendered copy if possible
-        if key in self.ftexCacheRendered:
+        try:
+            img = self.ftexCacheRendered[key]
             print('        Short-circuiting')
-            return self.ftexCacheRendered[key]
+            return img
+        except KeyError:
+            pass
 
-        # Render it
-        img = BFRES.texToQImage(self.ftexCacheRaw[key])
+        # Render it (the raw texture may have been evicted in the meantime
+        # if its model alone is bigger than the cache)
+        tex = self.ftexCacheRaw.get(key)
+        if tex is None:
+            raise ValueError('Key not found.')
+        img = BFRES.texToQImage(tex)
 
         # Cache it
         self.ftexCacheRendered[key] = img
@@ -918,178 +1266,31 @@ class AssetsClass:
         return img
 
 
-
-class CourseClass:
-    """
-    Class for a course from Super Mario Maker
-    """
-    def __init__(self):
+    def cacheStats(self):
         """
-        Initializes the course with default settings
+        Returns the hit/miss/eviction counters of the texture caches
         """
-        super().__init__()
-
-        self.headerStruct = struct.Struct('>QI4xH6BQB7x66s2s4BHBBI96sII12xI')
-        self.sprStruct = struct.Struct('>IIhbb4s4s4sbbhhbb')
-        self.effectStruct = struct.Struct('>5bxxx')
-
-    def load(self, data, progress=None):
-        """
-        Loads a Super Mario Maker course from bytes data.
-        """
-
-        header = self.headerStruct.unpack_from(data, 0)
-
-        def parseStyle(raw):
-            vals = [b'M1', b'M3', b'MW', b'WU']
-            return vals.index(raw) if raw in vals else 0
-
-        courseVer = header[0]; assert courseVer == 0xB
-        # header[1] is the CRC32 hash; we don't need to load this
-        self.creationYear = header[2]
-        self.creationMonth = header[3]
-        self.creationDay = header[4]
-        self.creationHour = header[5]
-        self.creationMinute = header[6]
-        self.unk16 = header[7]
-        self.unk17 = header[8]
-        self.unk181F = header[9]
-        self.unk20 = header[10]
-        self.courseName = header[11].rstrip(b'\0').decode('utf-16be')
-        self.style = parseStyle(header[12])
-        self.unk6C = header[13]
-        self.theme = header[14] % 6
-        self.unk6E = header[15]
-        self.unk6F = header[16]
-        self.timeLimit = header[17]
-        self.autoscroll = header[18]
-        self.unk73 = header[19]
-        self.unk7475 = header[20]
-        self.unk76D7 = header[21] # this reeeeeally needs to be figured out ASAP
-        self.unkD8DB = header[22]
-        self.unkDCDF = header[23]
-        numItems = header[24]
-
-
-        effects = []
-        for i in range(300):
-            effinfo = self.effectStruct.unpack_from(data, 0x145F0 + 8 * i)
-            eff = Effect(*effinfo)
-            effects.append(eff)
-
-
-        self.sprites = []
-        for i in range(numItems):
-            sprinfo = list(self.sprStruct.unpack_from(data, 0xF0 + 32 * i))
-
-            # Replace the effect index with the Effect object itself
-            eff = None if sprinfo[11] == -1 else effects[sprinfo[11] % 300]
-            sprinfo[11] = eff
-
-            # Fix up the positions
-            sprinfo[0] = sprinfo[0] // 10 - 8
-            sprinfo[1] = sprinfo[1] // 10
-            sprinfo[2] = sprinfo[2] // 10 - 8
-
-            spr = SpriteItem(*sprinfo)
-            self.sprites.append(spr)
-
-            spr.UpdateListItem()
-            spr.UpdateDynamicSizing()
-
-
-        # Success return value
-        return True
-
-
-    def save(self):
-        """
-        Save the course back to a file
-        """
-        header = self.headerStruct.pack(
-            0x0B,
-            0, # we can't calculate the hash yet; we fill it in later
-            self.creationYear,
-            self.creationMonth,
-            self.creationDay,
-            self.creationHour,
-            self.creationMinute,
-            self.unk16,
-            self.unk17,
-            self.unk181F,
-            self.unk20,
-            self.courseName.encode('utf-16be').ljust(66, b'\0'),
-            [b'M1', b'M3', b'MW', b'WU'][self.style % 4],
-            self.unk6C,
-            self.theme,
-            self.unk6E,
-            self.unk6F,
-            self.timeLimit,
-            self.autoscroll,
-            self.unk73,
-            self.unk7475,
-            self.unk76D7,
-            self.unkD8DB,
-            self.unkDCDF,
-            len(self.sprites),
-            )
-
-
-        effects = []
-        sprdata = b''
-        for spr in self.sprites:
-
-            if spr.effect is None:
-                b = None
-            else:
-                b = self.effectStruct.pack(
-                    spr.effect.unk00,
-                    spr.effect.unk01,
-                    spr.effect.unk02,
-                    spr.effect.unk03,
-                    spr.effect.unk04,
-                    )
-
-            if b is None:
-                thisEffIdx = -1
-            elif b in effects:
-                thisEffIdx = effects.index(b)
-            else:
-                effects.append(b)
-                thisEffIdx = len(effects) - 1
-
-            sprdata += self.sprStruct.pack(
-                spr.objx * 10 + 80,
-                spr.objz * 10,
-                spr.objy * 10 + 80,
-                spr.width,
-                spr.height,
-                spr.spritedata[:4],
-                spr.spritedata_sub,
-                spr.spritedata[4:],
-                spr.type,
-                spr.type_sub,
-                spr.linkingID,
-                thisEffIdx,
-                spr.costumeID,
-                spr.costumeID_sub,
-                )
-
-        sprdata = sprdata.ljust(0x14500, b'\0')
-
-        while len(effects) < 300: effects.append(DEFAULT_EFFECT)
-        effdata = b''.join(effects)
+        return {
+            'raw': self.ftexCacheRaw.stats(),
+            'rendered': self.ftexCacheRendered.stats(),
+            'tiles': SLib.TILE_CACHE.stats(),
+            }
 
-        cdt = bytearray(header + sprdata + effdata + b'\0' * 0xB0)
 
-        hash = binascii.crc32(cdt[16:]) & 0xFFFFFFFF
-        # Shamelessly splice this into the cdt
-        cdt[0x8] = hash >> 24
-        cdt[0x9] = (hash >> 16) & 0xFF
-        cdt[0xA] = (hash >> 8) & 0xFF
-        cdt[0xB] = hash & 0xFF
 
-        return bytes(cdt)
+class CourseClass(CourseLib.Course):
+    """
+    Class for a course from Super Mario Maker, with its sprites as
+    SpriteItems that can be shown in the editor
+    """
+    def makeSprite(self, sprinfo):
+        """
+        Creates a SpriteItem for a sprite being loaded
+        """
+        spr = SpriteItem(*sprinfo)
+        spr.UpdateListItem()
+        spr.UpdateDynamicSizing()
+        return spr
 
 
     # Python hax: automatically notify SLib whenever the style or theme changes!
@@ -1100,6 +1301,7 @@ class CourseClass:
     def style(self, value):
         SLib.Style = value
         self._style = value
+        self.schedulePrefetch()
     @property
     def theme(self):
         return self._theme
@@ -1107,6 +1309,23 @@ class CourseClass:
     def theme(self, value):
         SLib.Theme = value
         self._theme = value
+        self.schedulePrefetch()
+
+
+    prefetchScheduled = False
+    def schedulePrefetch(self):
+        """
+        Prefetches the tilesets from the event loop, so that it happens
+        once after the style and theme are both set, instead of once for
+        each. Courses rendered offscreen only load what they draw.
+        """
+        if mainWindow is None or self.prefetchScheduled: return
+        self.prefetchScheduled = True
+
+        def prefetch():
+            self.prefetchScheduled = False
+            SLib.PrefetchTilesets()
+        QtCore.QTimer.singleShot(0, prefetch)
 
 
     # The following insanely long constant was written by hand by RoadrunnerWMC.
@@ -1179,6 +1398,7 @@ class CourseClass:
 
             # Splice the correct value into the sprite data
             this.spritedata = this.spritedata[:7] + bytes([self.TERRAIN_EDGES[edges]])
+            this.markDirty()
 
             # Update stuff
             this.UpdateDynamicSizing()
@@ -1199,21 +1419,6 @@ class ListWidgetItem_SortsByOther(QtWidgets.QListWidgetItem):
         return self.reference < other.reference
 
 
-class Effect:
-    """
-    An effect you can place in your level.
-    """
-    def __init__(self, unk00, unk01, unk02, unk03, unk04):
-        """
-        Initializes the effect with the parameters given
-        """
-        self.unk00 = unk00
-        self.unk01 = unk01
-        self.unk02 = unk02
-        self.unk03 = unk03
-        self.unk04 = unk04
-
-
 class CourseEditorItem(QtWidgets.QGraphicsItem):
     """
     Class for any type of item that can show up in the course editor control
@@ -1353,8 +1558,9 @@ class SpriteItem(CourseEditorItem):
         self.effect = eff
         self.costumeID = costumeid
         self.costumeID_sub = subcostumeid
+        self.record = None # the packed sprite, while it's unchanged (see CourseLib.SpriteRecord)
 
-        self.font = NumberFont
+        self.font = resources.get('Number font')
         self.listitem = None
         self.CourseRect = QtCore.QRectF(self.objx / 16, self.objy / 16, TILE_WIDTH / 16, TILE_WIDTH / 16)
         self.ChangingPos = False
@@ -1362,6 +1568,7 @@ class SpriteItem(CourseEditorItem):
         SLib.SpriteImage.loadImages()
         self.ImageObj = SLib.SpriteImage(self)
 
+        resources.get('Sprite data')
         try:
             sname = Sprites[type_].name
             self.name = sname
@@ -1383,8 +1590,16 @@ class SpriteItem(CourseEditorItem):
         Sets the type of the sprite
         """
         self.type = type
+        self.markDirty()
         self.InitializeSprite()
 
+    def markDirty(self):
+        """
+        Marks the sprite as changed, so it's packed again when the
+        course is saved
+        """
+        self.record = None
+
     def ListString(self):
         """
         Returns a string that can be used to describe the sprite in a list
@@ -1572,6 +1787,7 @@ class SpriteItem(CourseEditorItem):
         Sets objx and objy to x and y, and then updates the sprite's position in the scene
         """
         self.objx, self.objy = x, y
+        self.markDirty()
         self.resetPos()
 
 
@@ -1673,6 +1889,7 @@ class SpriteItem(CourseEditorItem):
                 oldy = self.objy
                 self.objx = x
                 self.objy = y
+                if (oldx, oldy) != (x, y): self.markDirty()
                 if self.positionChanged is not None:
                     self.positionChanged(self, oldx, oldy, x, y)
 
@@ -1697,7 +1914,7 @@ class SpriteItem(CourseEditorItem):
         if event.button() == Qt.LeftButton:
             if QtWidgets.QApplication.keyboardModifiers() == Qt.ControlModifier:
                 if self.effect is not None:
-                    neweff = Effect(
+                    neweff = CourseLib.Effect(
                         self.effect.unk00,
                         self.effect.unk01,
                         self.effect.unk02,
@@ -1791,6 +2008,8 @@ class SpriteItem(CourseEditorItem):
         """
         Solves a small bug
         """
+        # Sprites rendered offscreen (see LoadCourseScene()) have no window
+        if mainWindow is None: return super().scene()
         return mainWindow.scene
 
     def delete(self):
@@ -1920,7 +2139,7 @@ class SpritePickerWidget(QtWidgets.QTreeWidget):
         self.setIndentation(16)
         self.currentItemChanged.connect(self.HandleItemChange)
 
-        LoadSpriteData()
+        resources.get('Sprite data')
         LoadSpriteCategories()
         self.LoadItems()
 
@@ -2218,7 +2437,7 @@ class SpriteEditorWidget(QtWidgets.QWidget):
         self.spriteLabel_sub_1 = QtWidgets.QLabel(_('<b>Subsprite</b>'))
         self.spriteNum_sub = QtWidgets.QSpinBox()
         self.spriteNum_sub.setMinimum(-1)
-        self.spriteNum_sub.setMaximum(len(Sprites) - 1)
+        self.spriteNum_sub.setMaximum(len(resources.get('Sprite data')) - 1)
         self.spriteNum_sub.valueChanged.connect(self.HandleOptionsChanged)
         self.spriteLabel_sub_2 = QtWidgets.QLabel(_('<b>: -</b>'))
 
@@ -2610,6 +2829,7 @@ class SpriteEditorWidget(QtWidgets.QWidget):
 
         self.spritetype = type
         self.subspritetype = subtype
+        resources.get('Sprite data')
         if type != 1000:
             sprite = Sprites[type]
         else:
@@ -3109,6 +3329,186 @@ class CourseScene(QtWidgets.QGraphicsScene):
         painter.drawRect(0, 0, (X_MAX + 1) * TILE_WIDTH, -Y_MIN * TILE_WIDTH) # bottom edge
 
 
+def NewCourseScene(parent=None):
+    """
+    Creates an empty CourseScene covering the whole editable area
+    """
+    scene = CourseScene(
+        X_MIN * TILE_WIDTH,
+        - (Y_MAX + 1) * TILE_WIDTH,
+        (X_MAX - X_MIN + 1) * TILE_WIDTH,
+        (Y_MAX - Y_MIN + 1) * TILE_WIDTH,
+        parent)
+    scene.setItemIndexMethod(QtWidgets.QGraphicsScene.NoIndex)
+    return scene
+
+
+def LoadCourseScene(data):
+    """
+    Loads course data into a new CourseScene that isn't shown in the main
+    window, so that it can be rendered offscreen. Returns (course, scene).
+    """
+    course = CourseClass()
+    if not course.load(data):
+        raise ValueError('Not a valid course')
+
+    scene = NewCourseScene()
+    for spr in course.sprites:
+        scene.addItem(spr)
+
+    return course, scene
+
+
+def StageRect():
+    """
+    Returns the part of the scene that's inside the stage boundaries
+    """
+    return QtCore.QRectF(
+        SMM_X_MIN * TILE_WIDTH,
+        - (SMM_Y_MAX + 1) * TILE_WIDTH,
+        (SMM_X_MAX - SMM_X_MIN + 1) * TILE_WIDTH,
+        (SMM_Y_MAX - SMM_Y_MIN + 1) * TILE_WIDTH,
+        )
+
+
+def SpritesRect(sprites, margin=TILE_WIDTH):
+    """
+    Returns the part of the scene covered by some sprites, plus a margin
+    around it, or None if there aren't any sprites
+    """
+    rect = None
+    for spr in sprites:
+        sprRect = spr.getFullRect()
+        rect = sprRect if rect is None else rect.united(sprRect)
+
+    if rect is None: return None
+    return rect.adjusted(-margin, -margin, margin, margin)
+
+
+def RenderScene(scene, rect, size=None):
+    """
+    Renders a rect of a course scene onto a new QImage of the given
+    QSize (by default, the size of the rect). Textures that are still
+    loading are waited for instead of being drawn as spriteboxes.
+    """
+    if size is None: size = rect.size().toSize()
+    image = QtGui.QImage(size, QtGui.QImage.Format_ARGB32)
+
+    # Textures that start loading during a pass are drawn in the next
+    # one; a few passes are enough for sprite images that need others
+    if Assets is not None: Assets.clearMisses()
+    for attempt in range(4):
+        image.fill(Qt.transparent)
+
+        painter = QtGui.QPainter(image)
+        painter.setRenderHint(QtGui.QPainter.SmoothPixmapTransform)
+        scene.render(painter, QtCore.QRectF(0, 0, size.width(), size.height()), rect, Qt.IgnoreAspectRatio)
+        painter.end()
+
+        if Assets is None or not Assets.waitForTextures(): break
+
+    return image
+
+
+EXPORT_TILE_SIZE = 512 # pixels
+def RenderSceneTile(scene, rect, size, x, y, width, height):
+    """
+    Renders the part of RenderScene(scene, rect, size) with its top-left
+    corner at (x, y) and the given width and height, as an RGBA8888 QImage
+    """
+    xScale = rect.width() / size.width()
+    yScale = rect.height() / size.height()
+    tileRect = QtCore.QRectF(rect.x() + x * xScale, rect.y() + y * yScale, width * xScale, height * yScale)
+
+    image = RenderScene(scene, tileRect, QtCore.QSize(width, height))
+    return image.convertToFormat(QtGui.QImage.Format_RGBA8888)
+
+
+def ExportScenePNG(scene, rect, size, filename, progress=None):
+    """
+    Saves a rect of a course scene as a PNG of the given QSize. It's
+    rendered one tile at a time and written out one row of tiles at a
+    time, so images of any size can be saved. progress(done, total) is
+    called after each tile.
+    """
+    width, height = size.width(), size.height()
+    tileSize = EXPORT_TILE_SIZE
+    total = math_ceil(width / tileSize) * math_ceil(height / tileSize)
+    done = 0
+
+    with open(filename, 'wb') as f:
+        writer = PNGWriter(f, width, height)
+
+        for top in range(0, height, tileSize):
+            rowHeight = min(tileSize, height - top)
+            rows = bytearray(width * rowHeight * 4)
+
+            for left in range(0, width, tileSize):
+                tile = RenderSceneTile(scene, rect, size, left, top, min(tileSize, width - left), rowHeight)
+                bits = tile.constBits()
+                bits.setsize(tile.byteCount())
+                bits = memoryview(bits)
+
+                # Copy the tile into its place in each row
+                tileRowSize = tile.width() * 4
+                for y in range(rowHeight):
+                    start = (y * width + left) * 4
+                    rows[start:start + tileRowSize] = bits[y * tile.bytesPerLine():y * tile.bytesPerLine() + tileRowSize]
+
+                done += 1
+                if progress is not None: progress(done, total)
+
+            writer.writeRows(rows)
+
+        writer.close()
+
+
+def ExportSceneDZI(scene, rect, size, filename, tileSize=254, overlap=1, progress=None):
+    """
+    Saves a rect of a course scene as a Deep Zoom image of the given
+    QSize, for deep-zoom viewers. filename is the .dzi file describing
+    it; the tiles go in the <name>_files folder next to it. Every tile is
+    rendered on its own, so images of any size can be saved.
+    progress(done, total) is called after each tile.
+    """
+    width, height = size.width(), size.height()
+    maxLevel = math_ceil(math_log2(max(width, height, 2)))
+    filesDir = os.path.splitext(filename)[0] + '_files'
+
+    # Level maxLevel is full size, and each level below it is half as big
+    levels = []
+    for level in range(maxLevel + 1):
+        factor = 2 ** (maxLevel - level)
+        levels.append((level, max(1, math_ceil(width / factor)), max(1, math_ceil(height / factor))))
+    total = sum(math_ceil(w / tileSize) * math_ceil(h / tileSize) for level, w, h in levels)
+    done = 0
+
+    for level, levelWidth, levelHeight in levels:
+        levelDir = os.path.join(filesDir, str(level))
+        os.makedirs(levelDir, exist_ok=True)
+        levelSize = QtCore.QSize(levelWidth, levelHeight)
+
+        for row in range(math_ceil(levelHeight / tileSize)):
+            for col in range(math_ceil(levelWidth / tileSize)):
+                # Tiles overlap their neighbors by a few pixels
+                left = max(0, col * tileSize - overlap)
+                top = max(0, row * tileSize - overlap)
+                right = min(levelWidth, (col + 1) * tileSize + overlap)
+                bottom = min(levelHeight, (row + 1) * tileSize + overlap)
+
+                tile = RenderSceneTile(scene, rect, levelSize, left, top, right - left, bottom - top)
+                tile.save(os.path.join(levelDir, '%d_%d.png' % (col, row)), 'PNG')
+
+                done += 1
+                if progress is not None: progress(done, total)
+
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" TileSize="%d" Overlap="%d" Format="png">\n' % (tileSize, overlap))
+        f.write('  <Size Width="%d" Height="%d"/>\n' % (width, height))
+        f.write('</Image>\n')
+
+
 class CourseViewWidget(QtWidgets.QGraphicsView):
     """
     QGraphicsView subclass for the course view
@@ -3659,7 +4059,7 @@ class CourseOptionsDialog(QtWidgets.QDialog):
 # Sets up the Screen Cap Choice Dialog
 class ScreenCapChoiceDialog(QtWidgets.QDialog):
     """
-    Dialog which lets you choose which zone to take a pic of
+    Dialog which lets you choose what to take a pic of
     """
     def __init__(self):
         """
@@ -3672,6 +4072,7 @@ class ScreenCapChoiceDialog(QtWidgets.QDialog):
         self.zoneCombo = QtWidgets.QComboBox()
         self.zoneCombo.addItem(_('Current Screen'))
         self.zoneCombo.addItem(_('Entire Course'))
+        self.zoneCombo.addItem(_('Entire Course (Deep Zoom Tiles)'))
 
         buttonBox = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
 
@@ -4356,7 +4757,7 @@ class PreferencesDialog(QtWidgets.QDialog):
 
                 ice = QtGui.QPixmap('metamakerdata/sprites/ice_flow_7.png')
 
-                font = QtGui.QFont(NumberFont) # need to make a new instance to avoid changing global settings
+                font = QtGui.QFont(resources.get('Number font')) # need to make a new instance to avoid changing global settings
                 font.setPointSize(6)
                 paint.setFont(font)
 
@@ -4424,6 +4825,37 @@ class ListWidgetWithToolTipSignal(QtWidgets.QListWidget):
 
 
 
+class DeferredWidget(QtWidgets.QWidget):
+    """
+    A QtWidgets.QWidget whose contents are filled in by a callback
+    the first time it's shown, once the window has had a chance to
+    paint, or earlier if something calls setUp() first.
+    """
+    def __init__(self, setup):
+        """
+        Initializes the widget
+        """
+        super().__init__()
+        self.setup = setup
+
+    def setUp(self):
+        """
+        Fills in the widget now, if that hasn't happened yet
+        """
+        if self.setup is None: return
+        setup, self.setup = self.setup, None
+        setup()
+
+    def showEvent(self, e):
+        """
+        Handles the widget being shown
+        """
+        super().showEvent(e)
+        if self.setup is not None:
+            QtCore.QTimer.singleShot(0, self.setUp)
+
+
+
 ####################################################################
 ####################################################################
 ####################################################################
@@ -4474,6 +4906,8 @@ class MetamakerWindow(QtWidgets.QMainWindow):
 
         self.ZoomLevels = [7.5, 10.0, 15.0, 20.0, 25.0, 30.0, 35.0, 40.0, 45.0, 50.0, 55.0, 60.0, 65.0, 70.0, 75.0, 85.0, 90.0, 95.0, 100.0, 125.0, 150.0, 175.0, 200.0, 250.0, 300.0, 350.0, 400.0]
 
+        autoSavePath, self.autoSaveLock = AutoSaveLocation()
+        self.autoSaver = AutoSaver(autoSavePath)
         self.AutosaveTimer = QtCore.QTimer()
         self.AutosaveTimer.timeout.connect(self.Autosave)
         self.AutosaveTimer.start(20000)
@@ -4491,13 +4925,7 @@ class MetamakerWindow(QtWidgets.QMainWindow):
         self.setIconSize(QtCore.QSize(16, 16))
 
         # create the course scene and view
-        self.scene = CourseScene(
-            X_MIN * TILE_WIDTH,
-            - (Y_MAX + 1) * TILE_WIDTH,
-            (X_MAX - X_MIN + 1) * TILE_WIDTH,
-            (Y_MAX - Y_MIN + 1) * TILE_WIDTH,
-            self)
-        self.scene.setItemIndexMethod(QtWidgets.QGraphicsScene.NoIndex)
+        self.scene = NewCourseScene(self)
         self.scene.selectionChanged.connect(self.ChangeSelectionHandler)
 
         self.view = CourseViewWidget(self.scene, self)
@@ -4542,7 +4970,21 @@ class MetamakerWindow(QtWidgets.QMainWindow):
         self.SetupDocksAndPanels()
 
         # load something
-        fn = QtWidgets.QFileDialog.getOpenFileName(self, _('Choose a course'), '', self.Filetypes)[0]
+        global RestoredFromAutoSave, AutoSavePath, AutoSaveData
+        autosave = AutoSaver.load(self.autoSaver.path)
+        if autosave is not None:
+            coursePath, data = autosave
+            if AutoSavedInfoDialog(coursePath or _('None')).exec_() == QtWidgets.QDialog.Accepted:
+                RestoredFromAutoSave = True
+                AutoSavePath = coursePath or 'None'
+                AutoSaveData = data
+            else:
+                self.autoSaver.clear()
+
+        if RestoredFromAutoSave:
+            fn = AutoSavePath
+        else:
+            fn = QtWidgets.QFileDialog.getOpenFileName(self, _('Choose a course'), '', self.Filetypes)[0]
         if fn: # the rest are optional
 
             mfp = QtWidgets.QFileDialog.getExistingDirectory(self, _('Find SMM\'s Model folder'))
@@ -4777,45 +5219,13 @@ class MetamakerWindow(QtWidgets.QMainWindow):
         dock.setWidget(tabs)
         self.creationTabs = tabs
 
-        # sprite tab: add
-        self.sprPickerTab = QtWidgets.QWidget()
+        # sprite tab: add (the sprite list is filled in by SetupSpritePicker())
+        self.sprPickerTab = DeferredWidget(self.SetupSpritePicker)
         tabs.addTab(self.sprPickerTab, GetIcon('spritesadd'), _('Add'))
 
         spl = QtWidgets.QVBoxLayout(self.sprPickerTab)
         self.sprPickerLayout = spl
 
-        svpl = QtWidgets.QHBoxLayout()
-        svpl.addWidget(QtWidgets.QLabel(_('View:')))
-
-        sspl = QtWidgets.QHBoxLayout()
-        sspl.addWidget(QtWidgets.QLabel(_('Search:')))
-
-        LoadSpriteCategories()
-        viewpicker = QtWidgets.QComboBox()
-        for view in SpriteCategories:
-            viewpicker.addItem(view[0])
-        viewpicker.currentIndexChanged.connect(self.SelectNewSpriteView)
-
-        self.spriteViewPicker = viewpicker
-        svpl.addWidget(viewpicker, 1)
-
-        self.spriteSearchTerm = QtWidgets.QLineEdit()
-        self.spriteSearchTerm.textChanged.connect(self.NewSearchTerm)
-        sspl.addWidget(self.spriteSearchTerm, 1)
-
-        spl.addLayout(svpl)
-        spl.addLayout(sspl)
-
-        self.spriteSearchLayout = sspl
-        sspl.itemAt(0).widget().setVisible(False)
-        sspl.itemAt(1).widget().setVisible(False)
-
-        self.sprPicker = SpritePickerWidget()
-        self.sprPicker.SpriteChanged.connect(self.SpriteChoiceChanged)
-        self.sprPicker.SpriteReplace.connect(self.SpriteReplace)
-        self.sprPicker.SwitchView(SpriteCategories[0])
-        spl.addWidget(self.sprPicker, 1)
-
         self.defaultPropButton = QtWidgets.QPushButton(_('Set Default Properties'))
         self.defaultPropButton.setEnabled(False)
         self.defaultPropButton.clicked.connect(self.ShowDefaultProps)
@@ -4863,18 +5273,56 @@ class MetamakerWindow(QtWidgets.QMainWindow):
         self.CreationTabChanged(0)
 
 
+    def SetupSpritePicker(self):
+        """
+        Sets up the sprite picker in the palette. This needs the sprite
+        data, so it's put off until the palette is first shown.
+        """
+        spl = self.sprPickerLayout
+
+        svpl = QtWidgets.QHBoxLayout()
+        svpl.addWidget(QtWidgets.QLabel(_('View:')))
+
+        sspl = QtWidgets.QHBoxLayout()
+        sspl.addWidget(QtWidgets.QLabel(_('Search:')))
+
+        LoadSpriteCategories()
+        viewpicker = QtWidgets.QComboBox()
+        for view in SpriteCategories:
+            viewpicker.addItem(view[0])
+        viewpicker.currentIndexChanged.connect(self.SelectNewSpriteView)
+
+        self.spriteViewPicker = viewpicker
+        svpl.addWidget(viewpicker, 1)
+
+        self.spriteSearchTerm = QtWidgets.QLineEdit()
+        self.spriteSearchTerm.textChanged.connect(self.NewSearchTerm)
+        sspl.addWidget(self.spriteSearchTerm, 1)
+
+        spl.insertLayout(0, svpl)
+        spl.insertLayout(1, sspl)
+
+        self.spriteSearchLayout = sspl
+        sspl.itemAt(0).widget().setVisible(False)
+        sspl.itemAt(1).widget().setVisible(False)
+
+        self.sprPicker = SpritePickerWidget()
+        self.sprPicker.SpriteChanged.connect(self.SpriteChoiceChanged)
+        self.sprPicker.SpriteReplace.connect(self.SpriteReplace)
+        self.sprPicker.SwitchView(SpriteCategories[0])
+        spl.insertWidget(2, self.sprPicker, 1)
+
+
     @QtCore.pyqtSlot()
     def Autosave(self):
         """
-        Auto saves the course
+        Auto saves the course. Only a snapshot is taken here; saving and
+        writing it happens on the autosaver's thread.
         """
-        return
         global AutoSaveDirty
         if not AutoSaveDirty: return
 
-        data = Course.save()
-        setSetting('AutoSaveFilePath', self.fileSavePath)
-        setSetting('AutoSaveFileData', QtCore.QByteArray(data))
+        self.autoSaver.save(Course.snapshot(), self.fileSavePath)
         AutoSaveDirty = False
 
 
@@ -5278,8 +5726,7 @@ class MetamakerWindow(QtWidgets.QMainWindow):
         AutoSaveDirty = False
         self.UpdateTitle()
 
-        #setSetting('AutoSaveFilePath', self.fileSavePath)
-        #setSetting('AutoSaveFileData', 'x')
+        self.autoSaver.clear()
         return True
 
 
@@ -5304,8 +5751,7 @@ class MetamakerWindow(QtWidgets.QMainWindow):
         with open(fn, 'wb') as f:
             f.write(data)
 
-        #setSetting('AutoSaveFilePath', fn)
-        #setSetting('AutoSaveFileData', 'x')
+        self.autoSaver.clear()
 
         self.UpdateTitle()
 
@@ -5549,8 +5995,10 @@ class MetamakerWindow(QtWidgets.QMainWindow):
             if hasattr(self, 'TipsBoxInstance'):
                 self.TipsBoxInstance.close()
 
-            setSetting('AutoSaveFilePath', 'none')
-            setSetting('AutoSaveFileData', 'x')
+            # The autosave is only deleted once the course is saved, so
+            # discarded changes can still be recovered next time
+            self.autoSaver.stop(5)
+            if self.autoSaveLock is not None: self.autoSaveLock.unlock()
 
             event.accept()
 
@@ -5561,17 +6009,30 @@ class MetamakerWindow(QtWidgets.QMainWindow):
         """
         global Assets
         Assets = AssetsClass(modelpath, packpath)
+        Assets.textureLoaded.connect(self.HandleTextureLoaded)
         SLib.Assets = Assets
 
 
+    @QtCore.pyqtSlot(str)
+    def HandleTextureLoaded(self, key):
+        """
+        Repaints the course once a texture finishes loading in the background
+        """
+        self.scene.update()
+
+
     def LoadCourse(self, name, isFullPath, courseNum):
         """
         Load a SMM course into the editor
         """
         global levName; levName=name.replace('\\', '/').split('/')[-1]
+        global RestoredFromAutoSave
 
+        restoring = RestoredFromAutoSave
         bad = False
-        if isFullPath and not isValidCourse(name):
+        if RestoredFromAutoSave:
+            pass
+        elif isFullPath and not isValidCourse(name):
             bad = True
         elif not isFullPath:
             QtWidgets.QMessageBox.warning(self, 'Metamaker', _("Open From Name isn't implemented yet. Sorry."), QtWidgets.QMessageBox.Ok)
@@ -5583,7 +6044,6 @@ class MetamakerWindow(QtWidgets.QMainWindow):
 
 
         # Get the data
-        global RestoredFromAutoSave
         if not RestoredFromAutoSave:
 
             # Check if there is a file by this name
@@ -5611,7 +6071,6 @@ class MetamakerWindow(QtWidgets.QMainWindow):
 
             # Get the course data
             courseData = AutoSaveData
-            SetDirty(noautosave=True)
 
             # Turn off the autosave flag
             RestoredFromAutoSave = False
@@ -5621,26 +6080,11 @@ class MetamakerWindow(QtWidgets.QMainWindow):
         Dirty = False
         DirtyOverride += 1
 
-        # Decompress the level if needed
-        if courseData[:4] == b'Yaz0':
-            courseData = yaz0.decompress_opt(courseData)
-
-        # Un-archive the level if needed
-        if courseData[:4] == b'SARC':
-            sarc = SarcLib.SARC_Archive()
-            sarc.load(courseData)
-
-            # This is a bad method that just grabs the first
-            # .cdt it finds, but... we don't necessarily know
-            # the filename to look for, so it would be hard
-            # to do much better than this.
-            for file in sarc.contents:
-                if file.name.endswith('.cdt') and isValidCourseData(file.data):
-                    courseData = file.data
-                    break
-            else:
-                QtWidgets.QMessageBox.warning(self, 'Metamaker', _("This file doesn't seem to be a valid course."), QtWidgets.QMessageBox.Ok)
-                return False
+        # Decompress and/or un-archive the level if needed
+        courseData = CourseLib.extractCourseData(courseData)
+        if courseData is None:
+            QtWidgets.QMessageBox.warning(self, 'Metamaker', _("This file doesn't seem to be a valid course."), QtWidgets.QMessageBox.Ok)
+            return False
 
 
         if app.splashscrn is not None:
@@ -5697,8 +6141,10 @@ class MetamakerWindow(QtWidgets.QMainWindow):
         # Turn snapping back on
         OverrideSnapping = False
 
-        # Turn the dirty flag off
+        # Turn the dirty flag off. A restored autosave hasn't been saved
+        # anywhere yet, though.
         DirtyOverride -= 1
+        Dirty = restoring
         self.UpdateTitle()
 
         # Update UI things
@@ -5946,10 +6392,11 @@ class MetamakerWindow(QtWidgets.QMainWindow):
             if (widget.effUnk00, widget.effUnk01, widget.effUnk02, widget.effUnk03, widget.effUnk04) == (-1, -1, 0, -1, -1):
                 obj.effect = None
             else:
-                obj.effect = Effect(widget.effUnk00, widget.effUnk01, widget.effUnk02, widget.effUnk03, widget.effUnk04)
+                obj.effect = CourseLib.Effect(widget.effUnk00, widget.effUnk01, widget.effUnk02, widget.effUnk03, widget.effUnk04)
             obj.costumeID = widget.costumeId
             obj.costumeID_sub = widget.costumeId_sub
             obj.type_sub = widget.subspritetype
+            obj.markDirty()
 
             obj.UpdateListItem()
             SetDirty()
@@ -6093,64 +6540,67 @@ class MetamakerWindow(QtWidgets.QMainWindow):
         """
 
         dlg = ScreenCapChoiceDialog()
-        if dlg.exec_() == dlg.Accepted:
-            fn = QtWidgets.QFileDialog.getSaveFileName(mainWindow, _('Choose a new filename'), '/untitled.png', _('Portable Network Graphics') + ' (*.png)')[0]
-            if fn == '': return
-            fn = str(fn)
-
-            if dlg.zoneCombo.currentIndex() == 0:
-                ScreenshotImage = QtGui.QImage(mainWindow.view.width(), mainWindow.view.height(), QtGui.QImage.Format_ARGB32)
-                ScreenshotImage.fill(Qt.transparent)
-
-                RenderPainter = QtGui.QPainter(ScreenshotImage)
-                mainWindow.view.render(RenderPainter, QtCore.QRectF(0, 0, mainWindow.view.width(), mainWindow.view.height()), QtCore.QRect(QtCore.QPoint(0, 0), QtCore.QSize(mainWindow.view.width(), mainWindow.view.height())))
-                RenderPainter.end()
-            elif dlg.zoneCombo.currentIndex() == 1:
-                maxX = maxY = 0
-                minX = minY = 0x0ddba11
-                for z in Course.zones:
-                    if maxX < ((z.objx*(TILE_WIDTH/16)) + (z.width*(TILE_WIDTH/16))):
-                        maxX = ((z.objx*(TILE_WIDTH/16)) + (z.width*(TILE_WIDTH/16)))
-                    if maxY < ((z.objy*(TILE_WIDTH/16)) + (z.height*(TILE_WIDTH/16))):
-                        maxY = ((z.objy*(TILE_WIDTH/16)) + (z.height*(TILE_WIDTH/16)))
-                    if minX > z.objx*(TILE_WIDTH/16):
-                        minX = z.objx*(TILE_WIDTH/16)
-                    if minY > z.objy*(TILE_WIDTH/16):
-                        minY = z.objy*(TILE_WIDTH/16)
-                maxX = (X_MAX*TILE_WIDTH if X_MAX*TILE_WIDTH < maxX+40 else maxX+40)
-                maxY = (Y_MAX*TILE_WIDTH if Y_MAX*TILE_WIDTH < maxY+40 else maxY+40)
-                minX = (0 if 40 > minX else minX-40)
-                minY = (40 if 40 > minY else minY-40)
-
-                ScreenshotImage = QtGui.QImage(int(maxX - minX), int(maxY - minY), QtGui.QImage.Format_ARGB32)
-                ScreenshotImage.fill(Qt.transparent)
-
-                RenderPainter = QtGui.QPainter(ScreenshotImage)
-                mainWindow.scene.render(RenderPainter, QtCore.QRectF(0, 0, int(maxX - minX), int(maxY - minY)), QtCore.QRectF(int(minX), int(minY), int(maxX - minX), int(maxY - minY)))
-                RenderPainter.end()
+        if dlg.exec_() != dlg.Accepted: return
+        choice = dlg.zoneCombo.currentIndex()
 
+        if choice == 2:
+            fn = QtWidgets.QFileDialog.getSaveFileName(mainWindow, _('Choose a new filename'), '/untitled.dzi', _('Deep Zoom Image') + ' (*.dzi)')[0]
+        else:
+            fn = QtWidgets.QFileDialog.getSaveFileName(mainWindow, _('Choose a new filename'), '/untitled.png', _('Portable Network Graphics') + ' (*.png)')[0]
+        if fn == '': return
+        fn = str(fn)
 
-            else:
-                i = dlg.zoneCombo.currentIndex() - 2
-                ScreenshotImage = QtGui.QImage(Course.zones[i].width*TILE_WIDTH/16, Course.zones[i].height*TILE_WIDTH/16, QtGui.QImage.Format_ARGB32)
-                ScreenshotImage.fill(Qt.transparent)
+        if choice == 0:
+            ScreenshotImage = QtGui.QImage(mainWindow.view.width(), mainWindow.view.height(), QtGui.QImage.Format_ARGB32)
+            ScreenshotImage.fill(Qt.transparent)
 
-                RenderPainter = QtGui.QPainter(ScreenshotImage)
-                mainWindow.scene.render(RenderPainter, QtCore.QRectF(0, 0, Course.zones[i].width*TILE_WIDTH/16, Course.zones[i].height*TILE_WIDTH/16), QtCore.QRectF(int(Course.zones[i].objx)*TILE_WIDTH/16, int(Course.zones[i].objy)*TILE_WIDTH/16, Course.zones[i].width*TILE_WIDTH/16, Course.zones[i].height*TILE_WIDTH/16))
-                RenderPainter.end()
+            RenderPainter = QtGui.QPainter(ScreenshotImage)
+            mainWindow.view.render(RenderPainter, QtCore.QRectF(0, 0, mainWindow.view.width(), mainWindow.view.height()), QtCore.QRect(QtCore.QPoint(0, 0), QtCore.QSize(mainWindow.view.width(), mainWindow.view.height())))
+            RenderPainter.end()
 
             ScreenshotImage.save(fn, 'PNG', 50)
+            return
 
+        # The entire course is everything with sprites in it, at the
+        # current zoom level. That can be far too big for one QImage, so
+        # it's rendered in tiles.
+        rect = SpritesRect(Course.sprites) or StageRect()
+        rect = rect.intersected(self.scene.sceneRect())
+        scale = self.view.transform().m11()
+        size = QtCore.QSize(max(1, math_ceil(rect.width() * scale)), max(1, math_ceil(rect.height() * scale)))
+
+        progress = QtWidgets.QProgressDialog(self)
+        progress.setCancelButton(None)
+        progress.setMinimumDuration(500)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setWindowTitle('Metamaker')
+        progress.setLabelText(_('Saving screenshot...'))
+
+        def updateProgress(done, total):
+            progress.setRange(0, total)
+            progress.setValue(done)
 
-def main():
+        try:
+            if choice == 1:
+                ExportScenePNG(self.scene, rect, size, fn, updateProgress)
+            else:
+                ExportSceneDZI(self.scene, rect, size, fn, progress=updateProgress)
+        except (IOError, OSError) as e:
+            QtWidgets.QMessageBox.warning(self, _('Error'), _('The screenshot could not be saved: {error}', 'error', str(e)))
+        finally:
+            progress.close()
+
+
+def InitializeMetamaker():
     """
-    Main startup function for Metamaker
+    Loads the settings and everything else the editor needs before a
+    course can be shown, without creating the main window. A
+    QApplication has to exist already. Returns False if any of the
+    required files are missing.
     """
 
-    global app, mainWindow, settings, METAMAKER_VERSION
-
-    # create an application
-    app = QtWidgets.QApplication(sys.argv)
+    global app, settings, METAMAKER_VERSION
+    app = QtWidgets.QApplication.instance()
 
     # load the settings
     settings = QtCore.QSettings('Metamaker', METAMAKER_VERSION)
@@ -6165,26 +6615,26 @@ def main():
 
     # check if required files are missing
     if FilesAreMissing():
-        sys.exit(1)
+        return False
 
     # load required stuff
     global Sprites
     global SpriteListData
     Sprites = None
     SpriteListData = None
-    LoadTheme()
     LoadConstantLists()
-    SetAppStyle()
-    LoadSpriteData()
-    LoadNumberFont()
+
+    # Everything else is loaded the first time it's needed
+    resources.register('Theme', LoadTheme)
+    resources.register('App style', SetAppStyle)
+    resources.register('Sprite data', LoadSpriteDataResource)
+    resources.register('Number font', LoadNumberFont)
+
+    resources.get('Theme')
+    resources.get('App style')
     SLib.OutlineColor = _c('smi')
     SLib.main()
 
-    # load the splashscreen
-    app.splashscrn = None
-    if checkSplashEnabled():
-        loadSplash()
-
     global EnableAlpha, GridType, CollisionsShown, DepthShown, RealViewEnabled
     global SpritesFrozen
     global SpritesShown, SpriteImagesShown
@@ -6200,10 +6650,35 @@ def main():
     SLib.RealViewEnabled = RealViewEnabled
     SLib.sprites = sprites
 
+    return True
+
+
+def main():
+    """
+    Main startup function for Metamaker
+    """
+
+    global app, mainWindow
+
+    # create an application
+    app = QtWidgets.QApplication(sys.argv)
+
+    if not InitializeMetamaker():
+        sys.exit(1)
+
+    # load the splashscreen
+    app.splashscrn = None
+    if checkSplashEnabled():
+        loadSplash()
+
     # create and show the main window
     mainWindow = MetamakerWindow()
     mainWindow.__init2__() # fixes bugs
     mainWindow.show()
+
+    resources.mark('Window shown')
+    if startupReport:
+        QtCore.QTimer.singleShot(0, lambda: print(resources.report()))
     exitcodesys = app.exec_()
     app.deleteLater()
     sys.exit(exitcodesys)
@@ -6212,4 +6687,6 @@ generateStringsXML = False
 if '-generatestringsxml' in sys.argv:
     generateStringsXML = True
 
+startupReport = '-startupreport' in sys.argv
+
 if __name__ == '__main__': main()
@@ -0,0 +1,112 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Metamaker - A low-level Super Mario Maker course editor
+# Version 0.1.0
+# Copyright (C) 2009-2019 Treeki, Tempus, angelsl, JasonP27, Kamek64,
+# MalStar1000, RoadrunnerWMC, AboodXD
+
+# This file is part of Metamaker.
+
+# Metamaker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Metamaker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Metamaker.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+# pngwriter.py
+# Writes PNG files a few rows at a time, so that images far too big to
+# fit in memory (like whole courses at high zoom) can still be saved
+
+
+################################################################
+################################################################
+
+# Imports
+
+import struct
+import zlib
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+IDAT_SIZE = 0x40000 # compressed bytes per IDAT chunk
+
+
+class PNGWriter():
+    """
+    Writes an 8-bit RGBA PNG to a file object, row by row. Call
+    writeRows() with the rows from top to bottom, then close().
+    """
+    def __init__(self, f, width, height, level=6):
+        """
+        Writes the PNG header
+        """
+        if width <= 0 or height <= 0:
+            raise ValueError('Invalid image size: %dx%d' % (width, height))
+
+        self.f = f
+        self.width = width
+        self.height = height
+        self.rowsLeft = height
+        self.compressor = zlib.compressobj(level)
+        self.pending = bytearray()
+
+        f.write(PNG_SIGNATURE)
+        # 8 bits per channel, RGBA, no interlacing
+        self.writeChunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+
+
+    def writeChunk(self, type, data):
+        """
+        Writes a chunk with its length and CRC
+        """
+        self.f.write(struct.pack('>I', len(data)) + type)
+        self.f.write(data)
+        self.f.write(struct.pack('>I', zlib.crc32(type + data) & 0xFFFFFFFF))
+
+
+    def writeRows(self, data):
+        """
+        Adds some rows of RGBA pixels (width * 4 bytes each) to the image
+        """
+        rowSize = self.width * 4
+        numRows, extra = divmod(len(data), rowSize)
+        if extra:
+            raise ValueError('Rows must be %d bytes long' % rowSize)
+        if numRows > self.rowsLeft:
+            raise ValueError('Too many rows for a %dx%d image' % (self.width, self.height))
+        self.rowsLeft -= numRows
+
+        # Every row starts with its filter type (0: none)
+        filtered = bytearray((rowSize + 1) * numRows)
+        data = memoryview(data)
+        for row in range(numRows):
+            start = row * (rowSize + 1) + 1
+            filtered[start:start + rowSize] = data[row * rowSize:(row + 1) * rowSize]
+
+        self.pending += self.compressor.compress(filtered)
+        while len(self.pending) >= IDAT_SIZE:
+            self.writeChunk(b'IDAT', bytes(self.pending[:IDAT_SIZE]))
+            del self.pending[:IDAT_SIZE]
+
+
+    def close(self):
+        """
+        Finishes the image. Every row has to have been written.
+        """
+        if self.rowsLeft:
+            raise ValueError('%d rows are missing' % self.rowsLeft)
+
+        self.pending += self.compressor.flush()
+        self.writeChunk(b'IDAT', bytes(self.pending))
+        self.pending = bytearray()
+        self.writeChunk(b'IEND', b'')
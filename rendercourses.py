@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: latin-1 -*-
+
+# Metamaker - A low-level Super Mario Maker course editor
+# Version 0.1.0
+# Copyright (C) 2009-2019 Treeki, Tempus, angelsl, JasonP27, Kamek64,
+# MalStar1000, RoadrunnerWMC, AboodXD
+
+# This file is part of Metamaker.
+
+# Metamaker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Metamaker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Metamaker.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+# rendercourses.py
+# Renders preview images of lots of courses without opening the editor,
+# using all CPU cores:
+#
+#     python3 rendercourses.py [-o OUTDIR] [-s SCALE] [-j JOBS] [--crop] [--model MODEL --pack PACK] PATH [PATH ...]
+#
+# Folders are searched recursively for .cdt, .szs and .sarc files. Each
+# course is saved as OUTDIR/<name>.png. Without a Model folder, sprites
+# are drawn as spriteboxes.
+
+
+################################################################
+################################################################
+
+# Imports
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+import course as CourseLib
+from spritestats import courseName
+from validatecourses import findCourseFiles
+import yaz0
+
+# Qt and the editor are only imported by the worker processes; see
+# initWorker()
+metamaker = None
+
+
+def initWorker(modelPath, packPath):
+    """
+    Sets up Qt and the editor in a worker process, without a window
+    """
+    global metamaker
+
+    # Must be set before the QApplication is created
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    from PyQt5 import QtWidgets
+    import metamaker
+
+    metamaker.app = QtWidgets.QApplication([sys.argv[0]])
+    if not metamaker.InitializeMetamaker():
+        raise RuntimeError('Some of the files in metamakerdata/ are missing')
+
+    # Like in the editor, the folders are optional. The workers share
+    # yaz0kit's temp files and the texture index with each other, so
+    # decompress in memory and leave the index scan to the editor.
+    metamaker.Assets = metamaker.AssetsClass(modelPath or '', packPath or '',
+                                             threadSafe=True, scan=False)
+    metamaker.SLib.Assets = metamaker.Assets
+
+
+def renderCourse(data, scale, crop):
+    """
+    Renders course data onto a QImage, scaled by scale (1 is 60 pixels
+    per block). The whole stage is rendered, unless crop is True, in
+    which case only the part with sprites in it is.
+    """
+    from PyQt5 import QtCore
+
+    course, scene = metamaker.LoadCourseScene(data)
+
+    rect = metamaker.StageRect()
+    if crop:
+        rect = metamaker.SpritesRect(course.sprites) or rect
+
+    size = QtCore.QSize(max(1, math.ceil(rect.width() * scale)), max(1, math.ceil(rect.height() * scale)))
+    return metamaker.RenderScene(scene, rect, size)
+
+
+def renderFile(path, outDir, scale, crop):
+    """
+    Renders every course in a course file to outDir. Returns a list of
+    (name, output path, error message or None).
+    """
+    results = []
+
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        # The Yaz0 and SARC code prints debugging info
+        with contextlib.redirect_stdout(sys.stderr):
+            files = CourseLib.unpackCourseFiles(data, yaz0.decompress)
+    except Exception as e:
+        return [(courseName(path, None), None, str(e) or type(e).__name__)]
+
+    for innerName, courseData in files:
+        name = courseName(path, innerName)
+        if not CourseLib.isValidCourseData(courseData):
+            results.append((name, None, 'not valid course data'))
+            continue
+
+        outPath = os.path.join(outDir, name + '.png')
+        try:
+            with contextlib.redirect_stdout(sys.stderr):
+                image = renderCourse(courseData, scale, crop)
+            if not image.save(outPath, 'PNG'):
+                raise IOError('could not write ' + outPath)
+        except Exception as e:
+            results.append((name, None, str(e) or type(e).__name__))
+            continue
+
+        results.append((name, outPath, None))
+
+    return results
+
+
+def main():
+    """
+    Main function
+    """
+    parser = argparse.ArgumentParser(description='Render preview images of Super Mario Maker course files.')
+    parser.add_argument('paths', nargs='+', metavar='PATH', help='course files, or folders to search for them')
+    parser.add_argument('-o', '--output', default='.', metavar='OUTDIR', help='folder to save the images to (default: the current folder)')
+    parser.add_argument('-s', '--scale', type=float, default=0.25, help='size of the images, where 1 is 60 pixels per block (default: 0.25)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of processes to use (default: one per CPU)')
+    parser.add_argument('--crop', action='store_true', help='only render the part of each course that has sprites in it')
+    parser.add_argument('--model', help="SMM's Model folder, for tiles and sprite images")
+    parser.add_argument('--pack', help="SMM's Pack folder")
+    args = parser.parse_args()
+
+    if args.scale <= 0:
+        parser.error('the scale must be positive')
+
+    # The workers change to the Metamaker folder, so use absolute paths
+    paths = [os.path.abspath(path) for path in findCourseFiles(args.paths)]
+    outDir = os.path.abspath(args.output)
+    os.makedirs(outDir, exist_ok=True)
+    modelPath = args.model and os.path.abspath(args.model)
+    packPath = args.pack and os.path.abspath(args.pack)
+
+    startTime = time.perf_counter()
+    numRendered = numFailed = 0
+
+    # Qt doesn't survive being forked, so every worker starts fresh and
+    # sets it up once for all of the courses it renders
+    jobs = args.jobs or os.cpu_count() or 1
+    chunksize = max(1, min(16, len(paths) // (8 * jobs)))
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(jobs, context, initWorker, (modelPath, packPath)) as executor:
+        for results in executor.map(renderFile, paths, [outDir] * len(paths), [args.scale] * len(paths), [args.crop] * len(paths), chunksize=chunksize):
+            for name, outPath, error in results:
+                if error is None:
+                    numRendered += 1
+                else:
+                    numFailed += 1
+                    print('Failed to render %s: %s' % (name, error), file=sys.stderr)
+
+    elapsed = time.perf_counter() - startTime
+    print('Rendered %d courses from %d files in %.2f s (%.1f courses/s); %d failed.' % (
+        numRendered, len(paths), elapsed, numRendered / elapsed if elapsed else 0, numFailed), file=sys.stderr)
+
+    sys.exit(1 if numFailed else 0)
+
+
+if __name__ == '__main__': main()
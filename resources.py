@@ -0,0 +1,169 @@
+#!/usr/bin/python
+# -*- coding: latin-1 -*-
+
+# Metamaker - A low-level Super Mario Maker course editor
+# Version 0.1.0
+# Copyright (C) 2009-2019 Treeki, Tempus, angelsl, JasonP27, Kamek64,
+# MalStar1000, RoadrunnerWMC, AboodXD
+
+# This file is part of Metamaker.
+
+# Metamaker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Metamaker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Metamaker.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+# resources.py
+# A registry of resources that are loaded the first time they're needed,
+# and that keeps track of when each one was loaded and how long it took
+
+
+################################################################
+################################################################
+
+# Imports
+
+from collections.abc import Mapping
+import threading
+import time
+
+
+class Resource():
+    """
+    A resource that's loaded by calling loader() the first time it's used
+    """
+    def __init__(self, name, loader):
+        """
+        Initializes the resource
+        """
+        self.name = name
+        self.loader = loader
+        self.value = None
+        self.loaded = False
+        self.loadedAt = None # seconds since the registry was created
+        self.duration = None # seconds
+
+
+class ResourceRegistry():
+    """
+    Keeps track of lazily-loaded resources
+    """
+    def __init__(self):
+        """
+        Initializes the registry
+        """
+        self.resources = {}
+        self.events = []
+        self.startTime = time.perf_counter()
+        self.lock = threading.RLock()
+
+
+    def register(self, name, loader):
+        """
+        Registers a resource. loader() is called the first time it's
+        requested, and its return value is kept as the resource's value.
+        """
+        with self.lock:
+            self.resources[name] = Resource(name, loader)
+
+
+    def get(self, name):
+        """
+        Returns a resource, loading it first if needed
+        """
+        resource = self.resources[name]
+        if resource.loaded: return resource.value
+
+        with self.lock:
+            if not resource.loaded:
+                start = time.perf_counter()
+                resource.value = resource.loader()
+                end = time.perf_counter()
+
+                resource.loadedAt = start - self.startTime
+                resource.duration = end - start
+                resource.loaded = True
+
+        return resource.value
+
+
+    def isLoaded(self, name):
+        """
+        Returns True if a resource has been loaded
+        """
+        return self.resources[name].loaded
+
+
+    def mark(self, event):
+        """
+        Records a milestone (such as "window shown") for the report
+        """
+        self.events.append((event, time.perf_counter() - self.startTime))
+
+
+    def report(self):
+        """
+        Returns a text report of which resources were loaded, when, and
+        how long they took, in the order they were loaded
+        """
+        loaded = sorted((r for r in self.resources.values() if r.loaded), key=lambda r: r.loadedAt)
+        notLoaded = [r for r in self.resources.values() if not r.loaded]
+
+        rows = [(r.loadedAt, '%8.1f ms  %8.1f ms  %s' % (r.loadedAt * 1000, r.duration * 1000, r.name)) for r in loaded]
+        rows.extend((at, '%8.1f ms  %11s  [%s]' % (at * 1000, '', event)) for event, at in self.events)
+        rows.sort(key=lambda row: row[0])
+
+        lines = ['   Started    Took       Resource']
+        lines.extend(line for at, line in rows)
+        lines.append('Loaded %d of %d resources in %.1f ms' % (len(loaded), len(self.resources), sum(r.duration for r in loaded) * 1000))
+        if notLoaded:
+            lines.append('Not loaded: ' + ', '.join(r.name for r in notLoaded))
+
+        return '\n'.join(lines)
+
+
+class LazyResourceDict(Mapping):
+    """
+    A read-only dict whose values are registered as separate resources,
+    so each one is only loaded when it's looked up
+    """
+    def __init__(self, registry, name, keys, loader):
+        """
+        Registers loader(key) as the resource "name key" for each key
+        """
+        self.registry = registry
+        self.names = {}
+
+        for key in keys:
+            self.names[key] = '%s %s' % (name, key)
+            registry.register(self.names[key], lambda key=key: loader(key))
+
+
+    def __getitem__(self, key):
+        return self.registry.get(self.names[key])
+
+
+    def __iter__(self):
+        return iter(self.names)
+
+
+    def __len__(self):
+        return len(self.names)
+
+
+# The registry used by Metamaker
+registry = ResourceRegistry()
+register = registry.register
+get = registry.get
+mark = registry.mark
+report = registry.report
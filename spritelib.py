@@ -31,11 +31,15 @@
 ################################################################
 
 # Imports
+import math
 import os.path
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 Qt = QtCore.Qt
 
+from lrucache import LRUCache
+import resources
+
 Assets = None
 
 OutlineColor = None
@@ -62,55 +66,150 @@ def main():
     """
     Resets Sprites.py to its original settings
     """
-    global OutlineColor, OutlinePen, OutlineBrush, TileAlphaColors
+    global OutlineColor, OutlinePen, OutlineBrush, TileAlphaColors, TileAlphaMasks
     OutlinePen = QtGui.QPen(OutlineColor, 4)
     OutlineBrush = QtGui.QBrush(OutlineColor)
 
-    for g, game in enumerate(['M1', 'M3', 'MW', 'WU']):
-        for t, theme in enumerate(['overworld', 'underground', 'castle', 'airship', 'underwater', 'hauntedhouse']):
-            TileAlphaMasks[(g, t)] = QtGui.QBitmap('metamakerdata/masks/%s_%s.png' % (game, theme))
+    # The masks are only loaded once a tileset that needs them is drawn
+    def loadMask(key):
+        game = ['M1', 'M3', 'MW', 'WU'][key[0]]
+        theme = ['overworld', 'underground', 'castle', 'airship', 'underwater', 'hauntedhouse'][key[1]]
+        return QtGui.QBitmap('metamakerdata/masks/%s_%s.png' % (game, theme))
+
+    keys = [(g, t) for g in range(4) for t in range(6)]
+    TileAlphaMasks = resources.LazyResourceDict(resources.registry, 'Tile alpha mask', keys, loadMask)
 
 
 
 def GetImg(imgname, image=False):
     """
     Returns the image specified. Format is "bfresname/texturename".
+    Returns None while the image is still loading in the background.
     """
-    img = Assets[imgname]
+    img = Assets.getAsync(imgname)
     if img is None: return
     if image: return img
     return QtGui.QPixmap.fromImage(img)
 
 
-TILE_CACHE = {}
-def GetTile(x, y, width=60):
+def TilesetName(style, theme):
+    """
+    Returns the name of the tileset texture for a style and theme
+    """
+    styleName = ['M1', 'M3', 'MW', 'WU'][style]
+    themeName = ['plain', 'underground', 'castle', 'airship', 'water', 'hauntedhouse'][theme]
+    return 'Model/%s_Field_%s/%s_Field_%s' % (styleName, themeName, styleName, themeName)
+
+
+def PrefetchTilesets():
+    """
+    Starts loading the current tileset in the background, followed by
+    the other themes of the current style, since those are the likeliest
+    to be switched to next
+    """
+    if Assets is None: return
+
+    for theme in [Theme] + [t for t in range(6) if t != Theme]:
+        Assets.getAsync(TilesetName(Style, theme), prefetch=True)
+
+
+def pixmapSize(pix):
+    """
+    Returns the number of bytes used by a QPixmap
+    """
+    return pix.width() * pix.height() * pix.depth() // 8
+
+
+def atlasSize(atlas):
     """
-    Convenience function to retrieve the tile at (x, y) from the current tileset
+    Returns the number of bytes used by the tiles in a tile atlas
     """
-    if (Style, Theme, x, y, width) in TILE_CACHE: return TILE_CACHE[(Style, Theme, x, y, width)]
+    return sum(pixmapSize(tile) for tile in atlas.values())
 
-    styleName = ['M1', 'M3', 'MW', 'WU'][Style]
-    themeName = ['plain', 'underground', 'castle', 'airship', 'water', 'hauntedhouse'][Theme]
-    tilesetName = 'Model/%s_Field_%s/%s_Field_%s' % (styleName, themeName, styleName, themeName)
-    tileset = GetImg(tilesetName)
 
-    if tileset is None:
-        retval = None
+ATLAS_CACHE = LRUCache(32 * 0x100000, atlasSize)
+def GetTileAtlas(style, theme):
+    """
+    Returns every tile of a tileset as a dict of (x, y): QPixmap, with the
+    alpha mask already applied. Returns None while the tileset is loading.
+    """
+    if (style, theme) in ATLAS_CACHE: return ATLAS_CACHE[(style, theme)]
+
+    tileset = GetImg(TilesetName(style, theme))
+    if tileset is None: return None
+
+    # Mask the whole tileset once, then cut all of the tiles out of it
+    tileset.setMask(TileAlphaMasks[(style, theme)])
+
+    if style < 3:
+        spacing, border, size = 16, 0, 16
     else:
-        tileset.setMask(TileAlphaMasks[(Style, Theme)])
+        spacing, border, size = 64, 2, 60
 
-        if Style < 3:
-            tile = tileset.copy(x * 16, y * 16, 16, 16)
-        else:
-            tile = tileset.copy(x * 64 + 2, y * 64 + 2, 60, 60)
+    atlas = {}
+    for y in range(tileset.height() // spacing):
+        for x in range(tileset.width() // spacing):
+            atlas[(x, y)] = tileset.copy(x * spacing + border, y * spacing + border, size, size)
 
-        retval = tile.scaledToWidth(width)
+    ATLAS_CACHE[(style, theme)] = atlas
+    return atlas
 
-    # Cache it and return
-    TILE_CACHE[(Style, Theme, x, y, width)] = retval
+
+TILE_CACHE = LRUCache(32 * 0x100000, pixmapSize)
+def GetTile(x, y, width=60, height=None):
+    """
+    Convenience function to retrieve the tile at (x, y) from the current
+    tileset, scaled to width x height (square by default)
+    """
+    if height is None: height = width
+    key = (Style, Theme, x, y, width, height)
+    if key in TILE_CACHE: return TILE_CACHE[key]
+
+    # None if the tileset is still loading
+    atlas = GetTileAtlas(Style, Theme)
+    if atlas is None or (x, y) not in atlas: return None
+
+    # Cache the scaled tile and return it
+    retval = atlas[(x, y)].scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    TILE_CACHE[key] = retval
     return retval
 
 
+def DrawTile(painter, x, y, tileX, tileY):
+    """
+    Draws the tile at (tileX, tileY) from the current tileset into the
+    tile-sized square at (x, y). Returns False if the tileset is still
+    loading.
+    """
+    atlas = GetTileAtlas(Style, Theme)
+    if atlas is None or (tileX, tileY) not in atlas: return False
+    source = atlas[(tileX, tileY)]
+
+    # Snap the square to whole screen pixels (so neighboring tiles meet
+    # exactly) and blit a copy of the tile scaled to exactly that size,
+    # so that nothing is resampled while painting
+    transform = painter.worldTransform()
+    if transform.type() <= QtGui.QTransform.TxScale and transform.m11() > 0 and transform.m22() > 0:
+        # (Both corners are mapped and rounded the same way as the
+        # neighbors' corners, so the edges are always shared)
+        topLeft = transform.map(QtCore.QPointF(x, y))
+        bottomRight = transform.map(QtCore.QPointF(x + TileWidth, y + TileWidth))
+        left, top = math.floor(topLeft.x() + 0.5), math.floor(topLeft.y() + 0.5)
+        width = math.floor(bottomRight.x() + 0.5) - left
+        height = math.floor(bottomRight.y() + 0.5) - top
+
+        # Scaled-up copies wouldn't be any sharper, so leave those to Qt
+        if 0 < width <= source.width() and 0 < height <= source.height():
+            painter.save()
+            painter.resetTransform()
+            painter.drawPixmap(QtCore.QPoint(left, top), GetTile(tileX, tileY, width, height))
+            painter.restore()
+            return True
+
+    painter.drawPixmap(QtCore.QRectF(x, y, TileWidth, TileWidth), source, QtCore.QRectF(source.rect()))
+    return True
+
+
 ################################################################
 ################################################################
 ################################################################
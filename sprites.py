@@ -61,11 +61,8 @@ class SpriteImage_Block(SLib.SpriteImage):
 
         painter.setRenderHint(QtGui.QPainter.Antialiasing)
 
-        tile = SLib.GetTile(self.blockX, self.blockY)
-        if tile is None:
-            self.spritebox.shown = True
-        else:
-            painter.drawPixmap(0, 0, tile)
+        # The tileset may still be loading, in which case this is repainted later
+        self.spritebox.shown = not SLib.DrawTile(painter, 0, 0, self.blockX, self.blockY)
 
 
 
@@ -135,8 +132,8 @@ class SpriteImage_SemisolidPlatform(SLib.SpriteImage): # 16
 
         painter.setRenderHint(QtGui.QPainter.Antialiasing)
 
-        if not self.paintSsP(painter, self.parent.spritedata, self.parent.width, self.parent.height):
-            self.spritebox.shown = True
+        # The tileset may still be loading, in which case this is repainted later
+        self.spritebox.shown = not self.paintSsP(painter, self.parent.spritedata, self.parent.width, self.parent.height)
 
 
     @staticmethod
@@ -150,52 +147,31 @@ class SpriteImage_SemisolidPlatform(SLib.SpriteImage): # 16
         # If both flags are set......? That still needs to be tested.
 
         # Draw corners
-        t = SLib.GetTile(offX, 3)
-        if t is None: return False
-        painter.drawPixmap(0, 0, t)
-
-        t = SLib.GetTile(offX + 2, 3)
-        if t is None: return False
-        painter.drawPixmap(w * 60 - 60, 0, t)
-
-        t = SLib.GetTile(offX, 6)
-        if t is None: return False
-        painter.drawPixmap(0, h * 60 - 60, t)
-
-        t = SLib.GetTile(offX + 2, 6)
-        if t is None: return False
-        painter.drawPixmap(w * 60 - 60, h * 60 - 60, t)
+        if not SLib.DrawTile(painter, 0, 0, offX, 3): return False
+        if not SLib.DrawTile(painter, w * 60 - 60, 0, offX + 2, 3): return False
+        if not SLib.DrawTile(painter, 0, h * 60 - 60, offX, 6): return False
+        if not SLib.DrawTile(painter, w * 60 - 60, h * 60 - 60, offX + 2, 6): return False
 
         # Draw the top and bottom
         for x in range(w - 2):
-            t = SLib.GetTile(offX + 1, 3)
-            if t is None: return False
-            painter.drawPixmap(60 + x * 60, 0, t)
-
-            t = SLib.GetTile(offX + 1, 6)
-            if t is None: return False
-            painter.drawPixmap(60 + x * 60, h * 60 - 60, t)
+            if not SLib.DrawTile(painter, 60 + x * 60, 0, offX + 1, 3): return False
+            if not SLib.DrawTile(painter, 60 + x * 60, h * 60 - 60, offX + 1, 6): return False
 
         # Draw the left and right sides
         for y in range(h - 2):
             i = (h - y) % 2 # from the bottom up, starting with the bottom tile
 
-            t = SLib.GetTile(offX, 4 + i)
-            if t is None: return False
-            painter.drawPixmap(0, 60 + y * 60, t)
-
-            t = SLib.GetTile(offX + 2, 4 + i)
-            if t is None: return False
-            painter.drawPixmap(w * 60 - 60, 60 + y * 60, t)
+            if not SLib.DrawTile(painter, 0, 60 + y * 60, offX, 4 + i): return False
+            if not SLib.DrawTile(painter, w * 60 - 60, 60 + y * 60, offX + 2, 4 + i): return False
 
         # Draw the center
         for x in range(w - 2):
             for y in range(h - 2):
                 i = (h - y + x) % 2 # from the bottom-left, starting with the bottom tile
 
-                t = SLib.GetTile(offX + 1, 4 + i)
-                if t is None: return False
-                painter.drawPixmap(60 + x * 60, 60 + y * 60, t)
+                if not SLib.DrawTile(painter, 60 + x * 60, 60 + y * 60, offX + 1, 4 + i): return False
+
+        return True
 
 
 # 17 - Bridge
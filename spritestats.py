@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: latin-1 -*-
+
+# Metamaker - A low-level Super Mario Maker course editor
+# Version 0.1.0
+# Copyright (C) 2009-2019 Treeki, Tempus, angelsl, JasonP27, Kamek64,
+# MalStar1000, RoadrunnerWMC, AboodXD
+
+# This file is part of Metamaker.
+
+# Metamaker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Metamaker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Metamaker.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+# spritestats.py
+# Counts how sprites are used across lots of courses, using all CPU
+# cores. Writes a table in the same format as metamakerdata/spriteinfo.txt:
+#
+#     python3 spritestats.py [-j JOBS] [-o OUTPUT] [--histograms JSONFILE] PATH [PATH ...]
+#
+# Folders are searched recursively for .cdt, .szs and .sarc files.
+
+
+################################################################
+################################################################
+
+# Imports
+
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import json
+import os
+import struct
+import sys
+import time
+
+import course as CourseLib
+from validatecourses import findCourseFiles
+import yaz0
+
+
+def courseName(path, innerName):
+    """
+    Returns the name to use for a course in the "Where" column. Courses
+    are usually called course_data.cdt and course_data_sub.cdt, so the
+    name of the bundle or folder they're in is used instead.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+
+    if innerName is None:
+        if not stem.startswith('course_data'): return stem
+        innerName, stem = stem, os.path.basename(os.path.dirname(os.path.abspath(path)))
+
+    innerStem = os.path.splitext(os.path.basename(innerName))[0]
+    if innerStem.startswith('course_data'):
+        return stem + innerStem[len('course_data'):]
+    return stem + '_' + innerStem
+
+
+def scanCourse(data, rows, histograms):
+    """
+    Adds the sprites in some course data to rows (a dict of
+    {type: {data: count}}, in the order they're first seen) and to the
+    histograms
+    """
+    numItems = min(struct.unpack_from('>I', data, CourseLib.NUM_ITEMS_OFFSET)[0], CourseLib.MAX_SPRITES)
+    start = CourseLib.SPRITES_OFFSET
+    table = memoryview(data)[start:start + CourseLib.SPRITE_SIZE * numItems]
+
+    for x, z, y, w, h, sd1, sdsub, sd2, type_, typesub, link, effIdx, costume, costumesub in CourseLib.spriteStruct.iter_unpack(table):
+        spritedata = sd1 + sd2
+
+        # spriteinfo.txt shows the middle four bytes
+        key = spritedata[2:4].hex() + ' ' + spritedata[4:6].hex()
+        typeRows = rows.setdefault(type_, {})
+        typeRows[key] = typeRows.get(key, 0) + 1
+
+        histograms['types'][type_] += 1
+        histograms['spritedata'][type_, spritedata.hex()] += 1
+        histograms['costumes'][type_, costume] += 1
+        if effIdx != -1:
+            effect = data[CourseLib.EFFECTS_OFFSET + CourseLib.EFFECT_SIZE * (effIdx % CourseLib.NUM_EFFECTS):][:5]
+            histograms['effects'][effect.hex()] += 1
+
+
+def newHistograms():
+    """
+    Returns empty histograms
+    """
+    return {'types': Counter(), 'spritedata': Counter(), 'costumes': Counter(), 'effects': Counter()}
+
+
+def scanFile(path):
+    """
+    Scans every course in a course file. Returns
+    (courses, histograms, skipped), where courses is a list of
+    (name, rows) (see scanCourse()) and skipped is a list of messages
+    about courses that couldn't be scanned.
+    """
+    courses = []
+    histograms = newHistograms()
+    skipped = []
+
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        # The Yaz0 and SARC code prints debugging info; keep it out of
+        # the table
+        with contextlib.redirect_stdout(sys.stderr):
+            files = CourseLib.unpackCourseFiles(data, yaz0.decompress)
+    except Exception as e:
+        return courses, histograms, ['%s: %s' % (path, str(e) or type(e).__name__)]
+
+    for innerName, courseData in files:
+        name = courseName(path, innerName)
+        if not CourseLib.isValidCourseData(courseData):
+            skipped.append('%s: not valid course data' % name)
+            continue
+
+        rows = {}
+        scanCourse(courseData, rows, histograms)
+        courses.append((name, rows))
+
+    return courses, histograms, skipped
+
+
+def writeTable(f, courses):
+    """
+    Writes a spriteinfo.txt-style table for a dict of {name: rows}
+    """
+    def line(first, where, count):
+        f.write((first + '    ' + where).ljust(47) + ' ' + str(count) + '\n')
+
+    line('Number: Data', 'Where', 'Num. of occurrences')
+
+    types = sorted(set(type_ for rows in courses.values() for type_ in rows))
+    names = sorted(courses)
+    for type_ in types:
+        for name in names:
+            for data, count in courses[name].get(type_, {}).items():
+                line('%d: %s' % (type_, data), name, count)
+
+
+def main():
+    """
+    Main function
+    """
+    parser = argparse.ArgumentParser(description='Count how sprites are used across Super Mario Maker course files.')
+    parser.add_argument('paths', nargs='+', metavar='PATH', help='course files, or folders to search for them')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of processes to use (default: one per CPU)')
+    parser.add_argument('-o', '--output', help='file to write the table to (default: stdout)')
+    parser.add_argument('--histograms', metavar='JSONFILE', help='also write sprite type, sprite data, costume and effect histograms to this file')
+    args = parser.parse_args()
+
+    paths = list(findCourseFiles(args.paths))
+    startTime = time.perf_counter()
+
+    courses = {}
+    histograms = newHistograms()
+    numSkipped = 0
+
+    # Each file is scanned in a worker process, and the results are
+    # merged here as they come in
+    jobs = args.jobs or os.cpu_count() or 1
+    chunksize = max(1, min(64, len(paths) // (8 * jobs)))
+    with ProcessPoolExecutor(jobs) as executor:
+        for fileCourses, fileHistograms, skipped in executor.map(scanFile, paths, chunksize=chunksize):
+            for name, rows in fileCourses:
+                if name in courses:
+                    print('Warning: more than one course is called %s; only the first is counted' % name, file=sys.stderr)
+                    continue
+                courses[name] = rows
+
+            for key, histogram in fileHistograms.items():
+                histograms[key].update(histogram)
+
+            for message in skipped:
+                print('Skipped ' + message, file=sys.stderr)
+            numSkipped += len(skipped)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            writeTable(f, courses)
+    else:
+        writeTable(sys.stdout, courses)
+
+    if args.histograms:
+        with open(args.histograms, 'w', encoding='utf-8') as f:
+            json.dump({
+                'types': {str(type_): count for type_, count in sorted(histograms['types'].items())},
+                'spritedata': [[type_, data, count] for (type_, data), count in sorted(histograms['spritedata'].items())],
+                'costumes': [[type_, costume, count] for (type_, costume), count in sorted(histograms['costumes'].items())],
+                'effects': dict(sorted(histograms['effects'].items())),
+                }, f, indent=1)
+
+    elapsed = time.perf_counter() - startTime
+    print('Scanned %d courses from %d files in %.2f s (%.1f files/s); skipped %d.' % (
+        len(courses), len(paths), elapsed, len(paths) / elapsed if elapsed else 0, numSkipped), file=sys.stderr)
+
+
+if __name__ == '__main__': main()
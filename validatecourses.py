@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: latin-1 -*-
+
+# Metamaker - A low-level Super Mario Maker course editor
+# Version 0.1.0
+# Copyright (C) 2009-2019 Treeki, Tempus, angelsl, JasonP27, Kamek64,
+# MalStar1000, RoadrunnerWMC, AboodXD
+
+# This file is part of Metamaker.
+
+# Metamaker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Metamaker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Metamaker.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+# validatecourses.py
+# Checks lots of course files at once, using all CPU cores, and prints
+# the results as JSON lines:
+#
+#     python3 validatecourses.py [-j JOBS] [-o OUTPUT] [--errors-only] PATH [PATH ...]
+#
+# Folders are searched recursively for .cdt, .szs and .sarc files.
+
+
+################################################################
+################################################################
+
+# Imports
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import json
+import os
+import sys
+import time
+
+import course as CourseLib
+import yaz0
+
+
+COURSE_EXTENSIONS = ('.cdt', '.szs', '.sarc')
+
+
+def findCourseFiles(paths):
+    """
+    Yields every course file in paths. Files are always included;
+    folders are searched recursively for files with a course extension.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+
+        for folder, subfolders, files in os.walk(path):
+            subfolders.sort()
+            for name in sorted(files):
+                if name.lower().endswith(COURSE_EXTENSIONS):
+                    yield os.path.join(folder, name)
+
+
+def validateFile(path):
+    """
+    Validates every course in a course file, and returns the results as
+    a dict that can be turned into JSON
+    """
+    result = {'path': path, 'ok': False, 'size': 0, 'courses': []}
+
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        result['size'] = len(data)
+
+        # (Many of these run at once, so decompress_opt() can't be used.)
+        # The Yaz0 and SARC code prints debugging info, which mustn't end
+        # up mixed in with the results
+        with contextlib.redirect_stdout(sys.stderr):
+            files = CourseLib.unpackCourseFiles(data, yaz0.decompress)
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+        return result
+
+    if not files:
+        result['error'] = 'No course data was found'
+        return result
+
+    for name, courseData in files:
+        problems = CourseLib.validate(courseData)
+
+        info = {'name': name, 'ok': not problems, 'problems': problems}
+        if len(courseData) >= CourseLib.headerStruct.size:
+            info['sprites'] = CourseLib.headerStruct.unpack_from(courseData, 0)[24]
+        result['courses'].append(info)
+
+    result['ok'] = all(info['ok'] for info in result['courses'])
+    return result
+
+
+def main():
+    """
+    Main function
+    """
+    parser = argparse.ArgumentParser(description='Validate Super Mario Maker course files.')
+    parser.add_argument('paths', nargs='+', metavar='PATH', help='course files, or folders to search for them')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of processes to use (default: one per CPU)')
+    parser.add_argument('-o', '--output', help='file to write the results to (default: stdout)')
+    parser.add_argument('--errors-only', action='store_true', help='only output files with problems')
+    args = parser.parse_args()
+
+    paths = list(findCourseFiles(args.paths))
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+
+    numFiles = numCourses = numInvalid = numBytes = 0
+    startTime = time.perf_counter()
+
+    # Big enough chunks to keep the overhead low, but small enough that
+    # every process gets a share
+    jobs = args.jobs or os.cpu_count() or 1
+    chunksize = max(1, min(64, len(paths) // (8 * jobs)))
+
+    try:
+        with ProcessPoolExecutor(jobs) as executor:
+
+            for result in executor.map(validateFile, paths, chunksize=chunksize):
+                numFiles += 1
+                numCourses += len(result['courses'])
+                numBytes += result['size']
+                if not result['ok']: numInvalid += 1
+
+                if result['ok'] and args.errors_only: continue
+                output.write(json.dumps(result) + '\n')
+    finally:
+        if output is not sys.stdout: output.close()
+
+    elapsed = time.perf_counter() - startTime
+    print('Checked %d files (%d courses, %.1f MB) in %.2f s: %.1f files/s, %.1f MB/s. %d files had problems.' % (
+        numFiles, numCourses, numBytes / 0x100000, elapsed,
+        numFiles / elapsed if elapsed else 0, numBytes / 0x100000 / elapsed if elapsed else 0,
+        numInvalid), file=sys.stderr)
+
+    return 1 if numInvalid else 0
+
+
+if __name__ == '__main__': sys.exit(main())